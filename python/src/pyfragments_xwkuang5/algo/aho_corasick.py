@@ -0,0 +1,338 @@
+import time
+from array import array
+
+import numpy as np
+
+# input is translated into symbol classes one block at a time
+_BLOCK_SIZE = 1 << 16
+
+
+def _blocks(text):
+
+    if isinstance(text, str):
+        return [text[i:i + _BLOCK_SIZE]
+                for i in range(0, len(text), _BLOCK_SIZE)]
+
+    view = memoryview(text).cast('B')
+
+    return [view[i:i + _BLOCK_SIZE] for i in range(0, len(view), _BLOCK_SIZE)]
+
+
+class _Default(dict):
+    """A str.translate table sending unknown characters to class 0"""
+
+    def __missing__(self, key):
+        return '\0'
+
+
+class AhoCorasick:
+    """An Aho-Corasick automaton matching many patterns in one pass
+
+    The patterns are inserted into a trie whose nodes are the states, and
+    every state gets a failure link to the state of its longest proper
+    suffix that is also in the trie. On a single pattern the trie is a
+    chain and the failure links are exactly kmp.partial_match_table.
+
+    Symbols are first mapped to small classes (the distinct symbols of the
+    patterns, plus class 0 for everything else), and the goto and failure
+    functions are then folded into one flat transition table of
+    num_states * num_classes int32 entries, built level by level with
+    numpy. Matching is then one table lookup per input symbol. The table is
+    an array.array, fast to index from python, and `transitions` is a
+    zero-copy numpy view of it.
+
+    Patterns are either all str, matched against str text, or all bytes,
+    matched against any bytes-like text (bytes, bytearray, memoryview,
+    mmap). Matches are (start, pattern index) pairs, ordered by end
+    position and then from the longest to the shortest pattern.
+
+        construction: O(m * num_classes) for m the total pattern length
+        matching: O(n + number of matches)
+    """
+
+    def __init__(self, patterns):
+
+        self._patterns = list(patterns)
+
+        if len(self._patterns) == 0:
+            raise ValueError("At least one pattern is needed!")
+
+        self._is_str = isinstance(self._patterns[0], str)
+
+        for pattern in self._patterns:
+            if isinstance(pattern, str) != self._is_str:
+                raise TypeError("Patterns must be all str or all bytes!")
+            if len(pattern) == 0:
+                raise ValueError("Patterns must not be empty!")
+
+        if not self._is_str:
+            self._patterns = [bytes(pattern) for pattern in self._patterns]
+
+        self._build_classes()
+        self._build_trie()
+        self._build_transitions()
+
+    def _build_classes(self):
+
+        symbols = sorted({
+            ord(ch) if self._is_str else ch
+            for pattern in self._patterns for ch in pattern
+        })
+
+        if not self._is_str and len(symbols) == 256:
+            # every byte is used, classes are the bytes themselves
+            self._class_of = {symbol: symbol for symbol in symbols}
+        else:
+            self._class_of = {
+                symbol: cls for cls, symbol in enumerate(symbols, start=1)
+            }
+
+        self._num_classes = max(self._class_of.values()) + 1
+
+        if self._is_str:
+            # str.translate then latin-1 encoding does the mapping in C
+            # when the classes fit in a byte
+            self._translate = (_Default({
+                symbol: chr(cls) for symbol, cls in self._class_of.items()
+            }) if self._num_classes <= 256 else None)
+        else:
+            table = bytearray(256)
+            for symbol, cls in self._class_of.items():
+                table[symbol] = cls
+            self._translate = bytes(table)
+
+    def _build_trie(self):
+
+        class_of = self._class_of
+        to_symbol = ord if self._is_str else int
+
+        children = {}  # (state, class) -> state
+        parent = [0]
+        label = [0]
+        depth = [0]
+        terminal = {}  # state -> indices of the patterns ending there
+
+        for idx, pattern in enumerate(self._patterns):
+            state = 0
+
+            for ch in pattern:
+                cls = class_of[to_symbol(ch)]
+                child = children.get((state, cls))
+
+                if child is None:
+                    child = len(parent)
+                    children[state, cls] = child
+                    parent.append(state)
+                    label.append(cls)
+                    depth.append(depth[state] + 1)
+
+                state = child
+
+            terminal.setdefault(state, []).append(idx)
+
+        self._num_states = len(parent)
+        self._parent = np.array(parent, dtype=np.int64)
+        self._label = np.array(label, dtype=np.int64)
+        self._depth = np.array(depth, dtype=np.int64)
+        self._terminal = terminal
+
+    def _build_transitions(self):
+
+        num_states, num_classes = self._num_states, self._num_classes
+
+        delta = np.zeros((num_states, num_classes), dtype=np.int32)
+        fail = np.zeros(num_states, dtype=np.int64)
+
+        states = np.arange(num_states)
+        order = np.argsort(self._depth, kind='stable')
+        bounds = np.searchsorted(self._depth[order],
+                                 np.arange(self._depth.max() + 2))
+
+        # a state's failure link and its missing transitions only depend
+        # on shallower states, so whole levels are resolved at once
+        for d in range(1, len(bounds) - 1):
+            level = order[bounds[d]:bounds[d + 1]]
+            parents, labels = self._parent[level], self._label[level]
+
+            # the same step as in partial_match_table: fall back along the
+            # parent's failure chain until the label can be extended
+            fail[level] = delta[fail[parents], labels]
+
+            # the parents' rows were copied from their failure states, only
+            # their own goto edges are missing
+            delta[parents, labels] = states[level]
+            delta[level] = delta[fail[level]]
+
+        self._fail = fail
+
+        # report[s] is the closest state on the failure chain of s (s
+        # included) where a pattern ends, next_report[s] the one after it
+        has_output = np.zeros(num_states, dtype=bool)
+        has_output[list(self._terminal)] = True
+
+        report = np.where(has_output, states, 0)
+        for d in range(1, len(bounds) - 1):
+            level = order[bounds[d]:bounds[d + 1]]
+            report[level] = np.where(has_output[level], level,
+                                     report[fail[level]])
+
+        self._transitions = array('i', delta.tobytes())
+        self._report = report.tolist()
+        self._next_report = report[fail].tolist()
+        # patterns ending in the same state are equal, so have one length
+        self._outputs = [None] * num_states
+        for state, indices in self._terminal.items():
+            self._outputs[state] = [(int(self._depth[state]), idx)
+                                    for idx in indices]
+
+    @property
+    def num_states(self):
+        return self._num_states
+
+    @property
+    def patterns(self):
+        return self._patterns
+
+    @property
+    def transitions(self):
+        """The transition table as a (num_states, num_classes) numpy view"""
+
+        return np.frombuffer(self._transitions, dtype=np.int32).reshape(
+            self._num_states, self._num_classes)
+
+    def failure(self, state):
+        return int(self._fail[state])
+
+    def _classes(self, block):
+        """Translate a block of text into a sequence of class numbers"""
+
+        if self._is_str:
+            if not isinstance(block, str):
+                raise TypeError("Expect str text!")
+
+            if self._translate is None:
+                get = self._class_of.get
+                return [get(ord(ch), 0) for ch in block]
+
+            return block.translate(self._translate).encode('latin-1')
+
+        if isinstance(block, str):
+            raise TypeError("Expect bytes-like text!")
+
+        return bytes(block).translate(self._translate)
+
+    def _scan(self, classes, state, offset, matches):
+        """Run the automaton from state over classes, the first of which is
+        at position offset, append the matches and return the final state"""
+
+        delta = self._transitions
+        width = self._num_classes
+        report = self._report
+
+        for pos, cls in enumerate(classes, start=offset + 1):
+            state = delta[state * width + cls]
+
+            if report[state]:
+                self._collect(state, pos, matches)
+
+        return state
+
+    def _collect(self, state, end, matches):
+
+        outputs = self._outputs
+        next_report = self._next_report
+
+        state = self._report[state]
+
+        while state:
+            for length, idx in outputs[state]:
+                matches.append((end - length, idx))
+            state = next_report[state]
+
+    def stream(self):
+        """Return a matcher that keeps its state between chunks"""
+
+        return AhoCorasickStream(self)
+
+    def iter_find(self, text):
+        """Lazily yield every match (start, pattern index) in text"""
+
+        matcher = self.stream()
+
+        for block in _blocks(text):
+            yield from matcher.feed(block)
+
+    def iter_chunks(self, chunks):
+        """Lazily yield every match over a stream of chunks, with starts
+        counted from the beginning of the stream"""
+
+        matcher = self.stream()
+
+        for chunk in chunks:
+            yield from matcher.feed(chunk)
+
+    def find_all(self, text):
+        return list(self.iter_find(text))
+
+
+class AhoCorasickStream:
+    """Matches an AhoCorasick automaton over consecutive chunks
+
+    A match may span several chunks, offsets are absolute positions in the
+    concatenation of every chunk fed so far.
+    """
+
+    def __init__(self, automaton):
+
+        self._automaton = automaton
+        self._state = 0
+        self.offset = 0
+
+    def reset(self):
+
+        self._state = 0
+        self.offset = 0
+
+    def feed(self, chunk):
+        """Consume chunk, return the list of matches ending inside it"""
+
+        automaton = self._automaton
+        matches = []
+
+        for block in _blocks(chunk):
+            self._state = automaton._scan(automaton._classes(block),
+                                          self._state, self.offset, matches)
+            self.offset += len(block)
+
+        return matches
+
+
+if __name__ == "__main__":
+
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+
+    print(automaton.find_all("ushers"))
+    print(list(AhoCorasick([b"he", b"she"]).iter_chunks([b"us", b"he",
+                                                          b"rs"])))
+
+    rng = np.random.default_rng(0)
+    alphabet = np.frombuffer(b"abcdefghijklmnopqrstuvwxyz ", dtype=np.uint8)
+
+    text = alphabet[rng.integers(0, len(alphabet), size=1 << 20)].tobytes()
+
+    for num_patterns in [10, 100, 1000, 20000]:
+        patterns = list({
+            alphabet[rng.integers(0, 26, size=rng.integers(4, 12))].tobytes()
+            for _ in range(num_patterns)
+        })
+
+        start = time.perf_counter()
+        automaton = AhoCorasick(patterns)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        num_matches = len(automaton.find_all(text))
+        scan = time.perf_counter() - start
+
+        print("%6d patterns: build %.3fs, scan 1MB %.3fs, %d matches" %
+              (len(patterns), build, scan, num_matches))
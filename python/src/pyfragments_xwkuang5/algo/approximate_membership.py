@@ -0,0 +1,335 @@
+import math
+import random
+import time
+from array import array
+
+import numpy as np
+
+_MASK32 = (1 << 32) - 1
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(key):
+    """Multiply-xorshift hash of an integer key, cheap enough to call per
+    lookup from python while still spreading keys over all 64 bits"""
+
+    # numpy integers can not be masked with a python int wider than 64 bits
+    z = ((int(key) & _MASK64) * 0x9E3779B97F4A7C15) & _MASK64
+
+    return z ^ (z >> 32)
+
+
+def _mix_many(keys):
+    """_mix over a numpy array, uint64 arithmetic wraps around"""
+
+    z = np.asarray(keys, dtype=np.int64).astype(np.uint64) * np.uint64(
+        0x9E3779B97F4A7C15)
+
+    return z ^ (z >> np.uint64(32))
+
+
+def _next_power_of_two(x):
+    return 1 << max(int(x) - 1, 0).bit_length()
+
+
+class BloomFilter:
+    """A Bloom filter over integer keys
+
+    The bit array is an array.array, which is fast to index from python, and
+    the bulk operations work on a zero-copy numpy view of the same buffer.
+    Positions come from double hashing h1 + i * h2 of one 64-bit hash.
+
+    A Bloom filter can not forget a key, remove is a no-op and a removed key
+    keeps answering True like any other false positive. The hash tables
+    rebuild their filter with empty_like whenever they resize, which also
+    drops the removed keys.
+    """
+
+    def __init__(self, capacity, fpr=0.01):
+
+        self.capacity = capacity
+        self._fpr = fpr
+
+        num_bits = -capacity * math.log(fpr) / math.log(2)**2
+
+        self._num_bits = max(_next_power_of_two(num_bits), 8)
+        self._mask = self._num_bits - 1
+        self._num_hashes = max(
+            1, round(self._num_bits / max(capacity, 1) * math.log(2)))
+
+        self._bits = array('B', bytes(self._num_bits // 8))
+        self._view = np.frombuffer(self._bits, dtype=np.uint8)
+
+    def empty_like(self, capacity):
+        """An empty filter with the same false positive rate, sized for
+        capacity keys"""
+
+        return BloomFilter(capacity, self._fpr)
+
+    def _positions(self, key):
+
+        h = _mix(key)
+        h1 = h & _MASK32
+        h2 = (h >> 32) | 1
+        mask = self._mask
+
+        return [(h1 + i * h2) & mask for i in range(self._num_hashes)]
+
+    def _positions_many(self, keys):
+
+        h = _mix_many(keys)
+        h1 = h & np.uint64(_MASK32)
+        h2 = (h >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self._num_hashes, dtype=np.uint64)
+
+        return ((h1[:, None] + i * h2[:, None]) & np.uint64(self._mask)).astype(
+            np.intp)
+
+    def add(self, key):
+
+        bits = self._bits
+
+        for pos in self._positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+
+        return True
+
+    def add_many(self, keys):
+
+        pos = self._positions_many(keys).ravel()
+
+        np.bitwise_or.at(self._view, pos >> 3,
+                         np.left_shift(1, pos & 7).astype(np.uint8))
+
+    def remove(self, key):
+        return False
+
+    def might_contain(self, key):
+
+        bits = self._bits
+
+        for pos in self._positions(key):
+            if not bits[pos >> 3] >> (pos & 7) & 1:
+                return False
+
+        return True
+
+    def might_contain_many(self, keys):
+
+        pos = self._positions_many(keys)
+
+        return np.all((self._view[pos >> 3] >> (pos & 7)) & 1, axis=1)
+
+
+class CuckooFilter:
+    """A cuckoo filter over integer keys, an approximate set with deletion
+
+    Each key is reduced to a small fingerprint stored in one of two buckets
+    of `bucket_size` slots, the second bucket being derived from the first
+    and the fingerprint alone so entries can be kicked between them. The
+    fingerprint width is chosen from the requested false positive rate,
+    about 2 * bucket_size / 2^bits.
+
+    If an insert still finds no room after max_kicks relocations, one
+    fingerprint has been lost and the filter becomes saturated: from then
+    on it answers True for every key, which keeps it safe to consult
+    before the real table. The hash tables rebuild their filter with
+    empty_like whenever they resize, so a saturated filter only lasts
+    until the next resize.
+    """
+
+    def __init__(self, capacity, fpr=0.01, bucket_size=4, max_kicks=500):
+
+        self.capacity = capacity
+        self._fpr = fpr
+
+        bits = max(4, math.ceil(math.log2(2 * bucket_size / fpr)))
+
+        if bits <= 8:
+            typecode, dtype = 'B', np.uint8
+        elif bits <= 16:
+            typecode, dtype = 'H', np.uint16
+        else:
+            typecode, dtype = 'I', np.uint32
+
+        self._fingerprint_mask = (1 << bits) - 1
+        self._bucket_size = bucket_size
+        self._max_kicks = max_kicks
+
+        self._num_buckets = max(
+            _next_power_of_two(math.ceil(capacity / (bucket_size * 0.95))), 2)
+        self._mask = self._num_buckets - 1
+
+        self._buckets = array(typecode,
+                              [0]) * (self._num_buckets * bucket_size)
+        self._view = np.frombuffer(self._buckets, dtype=dtype).reshape(
+            self._num_buckets, bucket_size)
+
+        self.saturated = False
+        self.num_items = 0
+
+    def empty_like(self, capacity):
+        """An empty filter with the same parameters, sized for capacity
+        keys"""
+
+        return CuckooFilter(capacity, self._fpr, self._bucket_size,
+                            self._max_kicks)
+
+    def _alternate(self, idx, fingerprint):
+        return idx ^ ((fingerprint * 0x5BD1E995) & self._mask)
+
+    def _locate(self, key):
+
+        h = _mix(key)
+        fingerprint = (h >> 32) & self._fingerprint_mask or 1
+        idx = h & self._mask
+
+        return fingerprint, idx, self._alternate(idx, fingerprint)
+
+    def _locate_many(self, keys):
+
+        h = _mix_many(keys)
+        fingerprint = ((h >> np.uint64(32)) &
+                       np.uint64(self._fingerprint_mask)).astype(np.int64)
+        fingerprint[fingerprint == 0] = 1
+        idx = (h & np.uint64(self._mask)).astype(np.int64)
+
+        return fingerprint, idx, idx ^ ((fingerprint * 0x5BD1E995) & self._mask)
+
+    def _put(self, idx, fingerprint):
+
+        buckets = self._buckets
+        base = idx * self._bucket_size
+
+        for slot in range(base, base + self._bucket_size):
+            if buckets[slot] == 0:
+                buckets[slot] = fingerprint
+                return True
+
+        return False
+
+    def add(self, key):
+        """Insert key, return False if the filter had to saturate"""
+
+        if self.saturated:
+            return False
+
+        fingerprint, i1, i2 = self._locate(key)
+
+        if self._put(i1, fingerprint) or self._put(i2, fingerprint):
+            self.num_items += 1
+            return True
+
+        buckets = self._buckets
+        idx = random.choice((i1, i2))
+
+        for _ in range(self._max_kicks):
+            slot = idx * self._bucket_size + random.randrange(
+                self._bucket_size)
+            fingerprint, buckets[slot] = buckets[slot], fingerprint
+            idx = self._alternate(idx, fingerprint)
+
+            if self._put(idx, fingerprint):
+                self.num_items += 1
+                return True
+
+        self.saturated = True
+
+        return False
+
+    def add_many(self, keys):
+
+        for key in np.asarray(keys, dtype=np.int64).tolist():
+            self.add(key)
+
+    def remove(self, key):
+        """Remove one copy of key, only call it for keys that were added"""
+
+        if self.saturated:
+            return False
+
+        fingerprint, i1, i2 = self._locate(key)
+        buckets = self._buckets
+
+        for idx in (i1, i2):
+            base = idx * self._bucket_size
+
+            for slot in range(base, base + self._bucket_size):
+                if buckets[slot] == fingerprint:
+                    buckets[slot] = 0
+                    self.num_items -= 1
+                    return True
+
+        return False
+
+    def might_contain(self, key):
+
+        if self.saturated:
+            return True
+
+        h = _mix(key)
+        fingerprint = (h >> 32) & self._fingerprint_mask or 1
+        i1 = h & self._mask
+        i2 = i1 ^ ((fingerprint * 0x5BD1E995) & self._mask)
+        buckets = self._buckets
+        size = self._bucket_size
+
+        return (fingerprint in buckets[i1 * size:(i1 + 1) * size] or
+                fingerprint in buckets[i2 * size:(i2 + 1) * size])
+
+    def might_contain_many(self, keys):
+
+        keys = np.asarray(keys, dtype=np.int64)
+
+        if self.saturated:
+            return np.ones(keys.shape, dtype=bool)
+
+        fingerprint, i1, i2 = self._locate_many(keys)
+        fingerprint = fingerprint[:, None]
+
+        return ((self._view[i1] == fingerprint).any(axis=1) |
+                (self._view[i2] == fingerprint).any(axis=1))
+
+
+if __name__ == "__main__":
+
+    from pyfragments_xwkuang5.algo.hash_table import HashTableChaining
+    from pyfragments_xwkuang5.algo.hash_table import HashtableOpenAddressing
+
+    num_keys = 200000
+    num_queries = 200000
+    miss_rate = 0.95
+
+    keys = np.unique(np.random.randint(0, 2**62, size=num_keys))
+    hits = np.random.choice(keys, size=int(num_queries * (1 - miss_rate)))
+    misses = np.random.randint(2**62, 2**63 - 1, size=num_queries - len(hits))
+    queries = np.random.permutation(np.concatenate([hits, misses]))
+    query_list = queries.tolist()
+
+    print("%d lookups, %d%% misses, seconds" %
+          (num_queries, round(miss_rate * 100)))
+    print("%36s %10s %10s" % ("", "search", "bulk"))
+
+    for table_type in [HashTableChaining, HashtableOpenAddressing]:
+        for prefilter in [
+                None,
+                BloomFilter(num_keys, 0.01),
+                CuckooFilter(num_keys, 0.01)
+        ]:
+            table = table_type(8, 0.1, 0.5, prefilter=prefilter)
+            table.insert_many(keys)
+
+            start = time.perf_counter()
+            for key in query_list:
+                table.search(key)
+            scalar = time.perf_counter() - start
+
+            start = time.perf_counter()
+            table.contains_many(queries)
+            bulk = time.perf_counter() - start
+
+            name = "%s + %s" % (table_type.__name__,
+                                type(prefilter).__name__
+                                if prefilter is not None else "none")
+
+            print("%36s %10.4f %10.4f" % (name, scalar, bulk))
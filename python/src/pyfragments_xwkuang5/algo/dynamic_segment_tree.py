@@ -0,0 +1,241 @@
+import bisect
+
+import numpy as np
+
+
+class DynamicSegmentTree:
+    """A sparse segment tree over the coordinates [lo, hi] that allocates
+    nodes on first touch
+
+    Every position starts at zero. Nodes live in parallel python lists
+    (children, pending add, sum, min, max), which the recursive walks index
+    much faster than numpy arrays and which hold exact python ints, node 0
+    being a shared sentinel for untouched all-zero subtrees. Range adds are
+    never pushed down, a node keeps its own add and the queries accumulate
+    the adds of the ancestors on the way down, so only the O(log(hi - lo))
+    nodes on the boundary paths of each update get allocated.
+
+    If all the coordinates are known up front, pass them as `coordinates`:
+    the tree is then built over their ranks only. Both ends of every range
+    must then be among the given coordinates, others raise ValueError.
+
+    All ranges are closed, [l, r], like SegmentTree.query.
+
+        memory: O(ops * log(hi - lo))
+        range add: O(log(hi - lo))
+        range sum / min / max: O(log(hi - lo))
+    """
+
+    def __init__(self, lo=0, hi=None, coordinates=None):
+
+        if coordinates is not None:
+            self._coordinates = np.unique(np.asarray(coordinates)).tolist()
+            lo, hi = 0, len(self._coordinates) - 1
+        else:
+            if hi is None:
+                raise ValueError("Either hi or coordinates is required!")
+            self._coordinates = None
+
+        if lo > hi:
+            raise ValueError("Empty coordinate range!")
+
+        self._lo = lo
+        self._hi = hi
+
+        # node 0 is the all-zero sentinel, node 1 is the root
+        self._left = [0, 0]
+        self._right = [0, 0]
+        self._add = [0, 0]
+        self._sum = [0, 0]
+        self._min = [0, 0]
+        self._max = [0, 0]
+
+    @property
+    def num_nodes(self):
+        return len(self._left)
+
+    def _new_node(self):
+
+        for field in (self._left, self._right, self._add, self._sum,
+                      self._min, self._max):
+            field.append(0)
+
+        return len(self._left) - 1
+
+    def _rank(self, coordinate):
+        """Position of one of the coordinates given at construction"""
+
+        rank = bisect.bisect_left(self._coordinates, coordinate)
+
+        if (rank == len(self._coordinates) or
+                self._coordinates[rank] != coordinate):
+            raise ValueError("Unknown coordinate %r!" % (coordinate, ))
+
+        return rank
+
+    def _compress(self, l, r):
+        """Map a coordinate range to the closed range of positions it covers"""
+
+        if self._coordinates is None:
+            return max(l, self._lo), min(r, self._hi)
+
+        return self._rank(l), self._rank(r)
+
+    def _range_add(self, node, lo, hi, l, r, val):
+
+        if node == 0:
+            node = self._new_node()
+
+        if l <= lo and hi <= r:
+            self._add[node] += val
+            self._sum[node] += val * (hi - lo + 1)
+            self._min[node] += val
+            self._max[node] += val
+            return node
+
+        mid = lo + (hi - lo) // 2
+
+        if l <= mid:
+            self._left[node] = self._range_add(self._left[node], lo, mid, l, r,
+                                               val)
+        if r > mid:
+            self._right[node] = self._range_add(self._right[node], mid + 1,
+                                                hi, l, r, val)
+
+        left = self._left[node]
+        right = self._right[node]
+        add = self._add[node]
+
+        self._sum[node] = (add * (hi - lo + 1) + self._sum[left] +
+                           self._sum[right])
+        self._min[node] = add + min(self._min[left], self._min[right])
+        self._max[node] = add + max(self._max[left], self._max[right])
+
+        return node
+
+    def _query(self, node, lo, hi, l, r, values, combine):
+        """Aggregate of [max(l, lo), min(r, hi)] for min or max"""
+
+        if node == 0 or (l <= lo and hi <= r):
+            return values[node]
+
+        mid = lo + (hi - lo) // 2
+
+        if r <= mid:
+            ret = self._query(self._left[node], lo, mid, l, r, values,
+                              combine)
+        elif l > mid:
+            ret = self._query(self._right[node], mid + 1, hi, l, r, values,
+                              combine)
+        else:
+            ret = combine(
+                self._query(self._left[node], lo, mid, l, r, values, combine),
+                self._query(self._right[node], mid + 1, hi, l, r, values,
+                            combine))
+
+        return ret + self._add[node]
+
+    def _query_sum(self, node, lo, hi, l, r):
+
+        if node == 0:
+            return 0
+        if l <= lo and hi <= r:
+            return self._sum[node]
+
+        mid = lo + (hi - lo) // 2
+
+        ret = self._add[node] * (min(r, hi) - max(l, lo) + 1)
+
+        if l <= mid:
+            ret += self._query_sum(self._left[node], lo, mid, l, r)
+        if r > mid:
+            ret += self._query_sum(self._right[node], mid + 1, hi, l, r)
+
+        return ret
+
+    def range_add(self, l, r, val):
+
+        l, r = self._compress(l, r)
+
+        if l <= r:
+            self._range_add(1, self._lo, self._hi, l, r, val)
+
+    def range_sum(self, l, r):
+
+        l, r = self._compress(l, r)
+
+        if l > r:
+            return 0
+
+        return self._query_sum(1, self._lo, self._hi, l, r)
+
+    def range_min(self, l, r):
+
+        l, r = self._compress(l, r)
+
+        if l > r:
+            raise ValueError("Empty range!")
+
+        return self._query(1, self._lo, self._hi, l, r, self._min, min)
+
+    def range_max(self, l, r):
+
+        l, r = self._compress(l, r)
+
+        if l > r:
+            raise ValueError("Empty range!")
+
+        return self._query(1, self._lo, self._hi, l, r, self._max, max)
+
+    def global_max(self):
+        return self._max[1]
+
+
+class DynamicSegmentTreeForKBooking:
+    """LazySegmentTreeForKBooking over an arbitrary coordinate range, e.g.
+    epoch millisecond timestamps, without preallocating the whole range
+
+    Pass `coordinates` (all the booking endpoints) to build over their ranks
+    instead, which keeps the tree depth at log(number of endpoints). Position
+    i then stands for the interval between the i-th and the next endpoint,
+    and booking with an endpoint that was not given raises ValueError.
+    """
+
+    def __init__(self, lo=0, hi=None, coordinates=None):
+
+        self._tree = DynamicSegmentTree(lo, hi, coordinates=coordinates)
+
+    def _book(self, start, end, val):
+
+        tree = self._tree
+
+        if tree._coordinates is None:
+            tree.range_add(start, end - 1, val)
+        else:
+            l, r = tree._rank(start), tree._rank(end) - 1
+
+            if l <= r:
+                tree._range_add(1, tree._lo, tree._hi, l, r, val)
+
+        return tree.global_max()
+
+    def book(self, start, end):
+        return self._book(start, end, 1)
+
+    def cancel(self, start, end):
+        return self._book(start, end, -1)
+
+
+if __name__ == "__main__":
+
+    hour = 3600 * 1000
+    now = 1700000000000
+
+    booking = DynamicSegmentTreeForKBooking(0, 2**41)
+
+    print(booking.book(now, now + hour))
+    print(booking.book(now, now + 2 * hour))
+    print(booking.book(now + hour, now + 2 * hour))
+    print(booking.book(now - hour, now + 3 * hour))
+    print(booking.cancel(now, now + 2 * hour))
+    print(booking._tree.num_nodes)
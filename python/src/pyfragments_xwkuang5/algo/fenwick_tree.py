@@ -0,0 +1,339 @@
+import time
+
+import numpy as np
+
+from pyfragments_xwkuang5.algo.segment_tree import SegmentTree
+
+
+class FenwickTree:
+    """A Fenwick (binary indexed) tree for point updates and range sums
+
+    It exposes the same update / query surface as SegmentTree(arr, 'sum') in
+    n + 1 slots instead of 2n. Slot i (1-based) holds the sum of the
+    i & -i positions ending at i.
+
+    Storage is a python list by default, which is the fastest for scalar
+    calls, or a numpy array with use_numpy=True, which is compact and lets
+    the batch operations run vectorized. A numpy tree switches to a wider
+    dtype when a value does not fit the current one, e.g. a float added to
+    an integer tree.
+
+        construction: O(n) time, O(n) space
+        add / update: O(log(n))
+        prefix sum / range query: O(log(n))
+    """
+
+    def __init__(self, arr, use_numpy=False, dtype=None):
+
+        values = np.asarray(arr, dtype=dtype)
+
+        self._size = len(values)
+        self._use_numpy = use_numpy
+
+        tree = np.zeros(self._size + 1, dtype=values.dtype)
+        tree[1:] = values
+
+        self._arr = values.copy() if use_numpy else values.tolist()
+        self._tree = tree if use_numpy else tree.tolist()
+
+        # numpy copy of a list tree for the batch queries, None when stale
+        self._tree_array = None
+
+        self._construct()
+
+    def _construct(self):
+        """Push each slot into its parent once, O(n) in total"""
+
+        tree = self._tree
+        size = self._size
+
+        for i in range(1, size + 1):
+            j = i + (i & -i)
+            if j <= size:
+                tree[j] += tree[i]
+
+    def _widen(self, values):
+        """Switch a numpy tree to a wider dtype if values do not fit the
+        current one"""
+
+        if not self._use_numpy:
+            return
+
+        dtype = np.result_type(self._tree.dtype, values)
+
+        if dtype != self._tree.dtype:
+            self._arr = self._arr.astype(dtype)
+            self._tree = self._tree.astype(dtype)
+
+    def add(self, idx, delta):
+
+        if idx < 0 or idx >= self._size:
+            raise ValueError("Incorrect update index!")
+
+        if self._use_numpy:
+            self._widen(delta)
+        else:
+            self._tree_array = None
+
+        tree = self._tree
+        size = self._size
+
+        self._arr[idx] += delta
+
+        idx += 1
+
+        while idx <= size:
+            tree[idx] += delta
+            idx += idx & -idx
+
+    def update(self, idx, val):
+        """Set position idx to val"""
+
+        if idx < 0 or idx >= self._size:
+            raise ValueError("Incorrect update index!")
+
+        self.add(idx, val - self._arr[idx])
+
+    def prefix_sum(self, idx):
+        """Sum of the positions [0, idx)"""
+
+        tree = self._tree
+        ret = 0
+
+        while idx > 0:
+            ret += tree[idx]
+            idx &= idx - 1
+
+        return ret
+
+    def query(self, l, r):
+        """Sum of the closed range [l, r]"""
+
+        if l < 0 or r >= self._size:
+            raise ValueError("Incorrect query range!")
+
+        return self.prefix_sum(r + 1) - self.prefix_sum(l)
+
+    def add_many(self, idxs, deltas):
+        """Add deltas[i] to position idxs[i] for every i, repeats accumulate"""
+
+        idxs = np.asarray(idxs, dtype=np.intp)
+        deltas = np.asarray(deltas)
+
+        if idxs.shape != deltas.shape:
+            raise ValueError("idxs and deltas must have the same length!")
+        if idxs.size == 0:
+            return
+        if idxs.min() < 0 or idxs.max() >= self._size:
+            raise ValueError("Incorrect update index!")
+
+        if not self._use_numpy:
+            for idx, delta in zip(idxs.tolist(), deltas.tolist()):
+                self.add(idx, delta)
+            return
+
+        self._widen(deltas)
+
+        deltas = deltas.astype(self._tree.dtype)
+        np.add.at(self._arr, idxs, deltas)
+
+        idxs = idxs + 1
+
+        while idxs.size != 0:
+            np.add.at(self._tree, idxs, deltas)
+            idxs = idxs + (idxs & -idxs)
+            mask = idxs <= self._size
+            idxs = idxs[mask]
+            deltas = deltas[mask]
+
+    def update_many(self, idxs, vals):
+        """Set position idxs[i] to vals[i] for every i, the last value wins"""
+
+        idxs = np.asarray(idxs, dtype=np.intp)
+        vals = np.asarray(vals)
+
+        if idxs.shape != vals.shape:
+            raise ValueError("idxs and vals must have the same length!")
+        if idxs.size == 0:
+            return
+        if idxs.min() < 0 or idxs.max() >= self._size:
+            raise ValueError("Incorrect update index!")
+
+        idxs, last = np.unique(idxs[::-1], return_index=True)
+        vals = vals[::-1][last]
+
+        if not self._use_numpy:
+            for idx, val in zip(idxs.tolist(), vals.tolist()):
+                self.add(idx, val - self._arr[idx])
+            return
+
+        self.add_many(idxs, vals - self._arr[idxs])
+
+    def prefix_sum_many(self, idxs):
+        """Sums of the positions [0, idxs[i]) for every i"""
+
+        idxs = np.array(idxs, dtype=np.intp, copy=True)
+
+        if self._use_numpy:
+            tree = self._tree
+        else:
+            if self._tree_array is None:
+                self._tree_array = np.asarray(self._tree)
+            tree = self._tree_array
+
+        ret = np.zeros(idxs.shape, dtype=tree.dtype)
+
+        mask = idxs > 0
+
+        while mask.any():
+            ret[mask] += tree[idxs[mask]]
+            idxs &= idxs - 1
+            mask = idxs > 0
+
+        return ret
+
+    def query_many(self, ls, rs):
+        """Sums of the closed ranges [ls[i], rs[i]] for every i"""
+
+        ls = np.asarray(ls, dtype=np.intp)
+        rs = np.asarray(rs, dtype=np.intp)
+
+        if ls.shape != rs.shape:
+            raise ValueError("ls and rs must have the same length!")
+        if ls.size != 0 and (ls.min() < 0 or rs.max() >= self._size):
+            raise ValueError("Incorrect query range!")
+
+        return self.prefix_sum_many(rs + 1) - self.prefix_sum_many(ls)
+
+
+class FenwickTree2D:
+    """A 2-d Fenwick tree over a numpy matrix for point updates and
+    rectangle sums
+
+        construction: O(nm) time, O(nm) space
+        add / update: O(log(n) * log(m))
+        rectangle query: O(log(n) * log(m))
+    """
+
+    def __init__(self, matrix, dtype=None):
+
+        values = np.asarray(matrix, dtype=dtype)
+
+        if values.ndim != 2:
+            raise ValueError("FenwickTree2D needs a 2-d matrix!")
+
+        self._rows, self._cols = values.shape
+        self._arr = values.copy()
+
+        self._tree = np.zeros((self._rows + 1, self._cols + 1),
+                              dtype=values.dtype)
+        self._tree[1:, 1:] = values
+
+        self._construct()
+
+    def _construct(self):
+        """Run the 1-d O(n) construction along rows and then columns"""
+
+        tree = self._tree
+
+        for i in range(1, self._rows + 1):
+            j = i + (i & -i)
+            if j <= self._rows:
+                tree[j, :] += tree[i, :]
+
+        for i in range(1, self._cols + 1):
+            j = i + (i & -i)
+            if j <= self._cols:
+                tree[:, j] += tree[:, i]
+
+    def add(self, row, col, delta):
+
+        if not (0 <= row < self._rows and 0 <= col < self._cols):
+            raise ValueError("Incorrect update index!")
+
+        tree = self._tree
+
+        self._arr[row, col] += delta
+
+        i = row + 1
+
+        while i <= self._rows:
+            j = col + 1
+            while j <= self._cols:
+                tree[i, j] += delta
+                j += j & -j
+            i += i & -i
+
+    def update(self, row, col, val):
+        """Set position (row, col) to val"""
+
+        if not (0 <= row < self._rows and 0 <= col < self._cols):
+            raise ValueError("Incorrect update index!")
+
+        self.add(row, col, val - self._arr[row, col])
+
+    def prefix_sum(self, row, col):
+        """Sum of the rectangle [0, row) x [0, col)"""
+
+        tree = self._tree
+        ret = 0
+
+        i = row
+
+        while i > 0:
+            j = col
+            while j > 0:
+                ret += tree[i, j]
+                j &= j - 1
+            i &= i - 1
+
+        return ret
+
+    def query(self, row1, col1, row2, col2):
+        """Sum of the closed rectangle [row1, row2] x [col1, col2]"""
+
+        if not (0 <= row1 and row2 < self._rows and 0 <= col1 and
+                col2 < self._cols):
+            raise ValueError("Incorrect query range!")
+
+        return (self.prefix_sum(row2 + 1, col2 + 1) -
+                self.prefix_sum(row1, col2 + 1) -
+                self.prefix_sum(row2 + 1, col1) + self.prefix_sum(row1, col1))
+
+
+if __name__ == "__main__":
+
+    repetition = 10000
+
+    print("seconds per update + query pair")
+    print("%10s %12s %12s %12s" %
+          ("size", "fenwick", "fenwick_np", "segment"))
+
+    for size in [10**i for i in range(2, 7)]:
+
+        arr = np.random.randint(0, 100, size=size)
+        idxs = np.random.randint(0, size, size=repetition).tolist()
+        vals = np.random.randint(0, 100, size=repetition).tolist()
+        ls = np.random.randint(0, size, size=repetition)
+        rs = np.minimum(ls + np.random.randint(0, size, size=repetition),
+                        size - 1)
+        ls, rs = ls.tolist(), rs.tolist()
+
+        timings = []
+
+        for build in [
+                lambda: FenwickTree(arr),
+                lambda: FenwickTree(arr, use_numpy=True),
+                lambda: SegmentTree(arr, 'sum')
+        ]:
+            tree = build()
+
+            start = time.perf_counter()
+
+            for idx, val, l, r in zip(idxs, vals, ls, rs):
+                tree.update(idx, val)
+                tree.query(l, r)
+
+            timings.append((time.perf_counter() - start) / repetition)
+
+        print("%10d %12.3e %12.3e %12.3e" % (size, *timings))
@@ -1,5 +1,202 @@
+import math
+import multiprocessing
+import os
 from collections import defaultdict
-from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from pyfragments_xwkuang5.algo.priority_queue import PriorityQueue
+
+# handle of a vertex that left the queue for good
+_SETTLED = -2
+
+# bottom-up BFS checks the first in-edges one at a time, so most vertices
+# stop at their first parent, before gathering the rest at once
+_BOTTOM_UP_ROUNDS = 4
+
+
+def _gather(indptr, indices, vertices, skip=0):
+    """(neighbors, sources) over the edges of vertices, skipping the first
+    `skip` edges of each, in vertex then edge order"""
+
+    starts = indptr[vertices] + skip
+    counts = np.maximum(indptr[vertices + 1] - starts, 0)
+    total = int(counts.sum())
+
+    ends = np.cumsum(counts)
+    offsets = np.arange(total) + np.repeat(starts - (ends - counts), counts)
+
+    return indices[offsets], np.repeat(vertices, counts)
+
+
+def _top_down_step(indptr, indices, frontier, level):
+    """The unvisited out-neighbors of frontier, each with one parent in it"""
+
+    neighbors, sources = _gather(indptr, indices, frontier)
+
+    unvisited = level[neighbors] == -1
+    neighbors, first = np.unique(neighbors[unvisited], return_index=True)
+
+    return neighbors, sources[unvisited][first]
+
+
+def _in_bitset(bits, vertices):
+    return ((bits[vertices >> 3] >> (vertices & 7)) & 1).astype(bool)
+
+
+def _bottom_up_step(indptr, indices, bits, level, lo, hi):
+    """The unvisited vertices of [lo, hi) with an in-neighbor in the
+    frontier bitset, each with one such parent, indptr and indices being
+    the reverse graph"""
+
+    candidates = lo + np.flatnonzero(level[lo:hi] == -1)
+    candidates = candidates.astype(indices.dtype, copy=False)
+    found, parents = [], []
+
+    for k in range(_BOTTOM_UP_ROUNDS):
+        starts = indptr[candidates]
+        candidates = candidates[indptr[candidates + 1] - starts > k]
+
+        if len(candidates) == 0:
+            break
+
+        neighbors = indices[indptr[candidates] + k]
+        hit = _in_bitset(bits, neighbors)
+
+        found.append(candidates[hit])
+        parents.append(neighbors[hit])
+        candidates = candidates[~hit]
+
+    if len(candidates) != 0:
+        neighbors, owners = _gather(indptr, indices, candidates,
+                                    _BOTTOM_UP_ROUNDS)
+        hit = _in_bitset(bits, neighbors)
+        owners, first = np.unique(owners[hit], return_index=True)
+
+        found.append(owners)
+        parents.append(neighbors[hit][first])
+
+    if not found:
+        return candidates, candidates
+
+    found = np.concatenate(found)
+    order = np.argsort(found, kind='stable')
+
+    return found[order], np.concatenate(parents)[order]
+
+
+# views of the shared arrays in a BFS pool worker
+_shared = {}
+
+
+def _attach(specs):
+
+    for key, (name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _shared[key] = (block, np.ndarray(shape, dtype=dtype,
+                                          buffer=block.buf))
+
+
+def _pool_top_down(frontier):
+
+    return _top_down_step(_shared['indptr'][1], _shared['indices'][1],
+                          frontier, _shared['level'][1])
+
+
+def _pool_bottom_up(lo, hi):
+
+    return _bottom_up_step(_shared['reverse_indptr'][1],
+                           _shared['reverse_indices'][1], _shared['bits'][1],
+                           _shared['level'][1], lo, hi)
+
+
+class _BFSPool:
+    """A process pool expanding BFS levels over shared memory
+
+    The arrays of the graph and its reverse, the level array and the
+    frontier bitset are copied once into shared memory blocks that every
+    worker maps. Workers only read them: a level is split into chunks, each
+    worker returns the vertices it found with their parents, and the caller
+    merges them and writes the level array, so no locking is needed.
+    """
+
+    def __init__(self, graph, reverse, processes):
+
+        arrays = {
+            'indptr': graph.indptr,
+            'indices': graph.indices,
+            'reverse_indptr': reverse.indptr,
+            'reverse_indices': reverse.indices,
+            'level': np.full(graph.num_vertices, -1, graph.indices.dtype),
+            'bits': np.zeros((graph.num_vertices + 7) // 8, np.uint8),
+        }
+
+        self._blocks = []
+        self._views = {}
+        specs = {}
+
+        for key, arr in arrays.items():
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(arr.nbytes, 1))
+            self._blocks.append(block)
+
+            view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)
+            view[:] = arr
+            self._views[key] = view
+            specs[key] = (block.name, arr.shape, arr.dtype.str)
+
+        self.level = self._views['level']
+        self.bits = self._views['bits']
+
+        self._num_chunks = 4 * processes
+
+        # vertex ranges with about the same number of in-edges each
+        bounds = np.searchsorted(
+            reverse.indptr,
+            np.linspace(0, reverse.num_edges, self._num_chunks + 1))
+        bounds[0], bounds[-1] = 0, graph.num_vertices
+        bounds = np.unique(bounds).tolist()
+        self._ranges = list(zip(bounds, bounds[1:]))
+
+        self._pool = multiprocessing.get_context().Pool(
+            processes, initializer=_attach, initargs=(specs, ))
+
+    def top_down(self, frontier):
+
+        chunks = [
+            chunk for chunk in np.array_split(frontier, self._num_chunks)
+            if len(chunk) != 0
+        ]
+        results = self._pool.map(_pool_top_down, chunks)
+
+        # a vertex may be found from several chunks, keep the first parent
+        neighbors, first = np.unique(np.concatenate(
+            [neighbors for neighbors, _ in results]),
+                                     return_index=True)
+
+        return neighbors, np.concatenate([parents
+                                          for _, parents in results])[first]
+
+    def bottom_up(self):
+
+        results = self._pool.starmap(_pool_bottom_up, self._ranges)
+
+        # the ranges are disjoint and in order, so is the result
+        return (np.concatenate([found for found, _ in results]),
+                np.concatenate([parents for _, parents in results]))
+
+    def close(self):
+
+        self._pool.terminate()
+        self._pool.join()
+
+        # the views must be gone before their blocks can be closed
+        self.level = self.bits = self._views = None
+
+        for block in self._blocks:
+            block.close()
+            block.unlink()
 
 
 class DirectedGraph:
@@ -9,72 +206,632 @@ class DirectedGraph:
 
         self.edges = defaultdict(list)
 
+        self._csr = None
+
     def add_edges(self, u, v):
 
         self.edges[u].append(v)
+        self._csr = None
+
+    def to_csr(self):
+        """Freeze the graph into a CSRGraph, keeping the edge order"""
+
+        src = [u for u in self.edges for _ in self.edges[u]]
+        dst = [v for u in self.edges for v in self.edges[u]]
+
+        return CSRGraph.from_edges(len(self.V), src, dst)
 
     def bi_search(self, src, dst):
-        def intersect(src_visited, dst_visited):
 
-            for i in range(len(src_visited)):
-                if src_visited[i] and dst_visited[i]:
-                    return i
-            return -1
+        if self._csr is None:
+            self._csr = self.to_csr()
+
+        return self._csr.bi_search(src, dst)
+
+
+class CSRGraph:
+    """An immutable directed graph in compressed sparse row form
+
+    The out-neighbours of u are indices[indptr[u]:indptr[u + 1]], with the
+    matching edge weights in weights when the graph is weighted. Vertices
+    are 0..V-1 and indices are int32 whenever V allows it, so an edge costs
+    4 bytes (12 with float64 weights) instead of roughly 100 for a python
+    int in an adjacency list.
+
+    The reverse graph, the same layout over the incoming edges ordered by
+    source vertex, is built on first use by reverse() and cached. save
+    writes every array with np.save and load memory-maps them back, so
+    opening a saved graph is zero-copy and takes constant time.
+    """
+
+    _ARRAYS = ('indptr', 'indices', 'weights')
+
+    def __init__(self, indptr, indices, weights=None):
+
+        if len(indptr) == 0 or indptr[-1] != len(indices):
+            raise ValueError("indptr does not match indices!")
+
+        if weights is not None and len(weights) != len(indices):
+            raise ValueError("weights and indices must have the same length!")
+
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+        self._reverse = None
+        self._scratch = None
+        self._dijkstra_scratch = None
+
+    @staticmethod
+    def _index_dtype(num_vertices):
+        return np.int32 if num_vertices <= np.iinfo(np.int32).max else np.int64
+
+    @classmethod
+    def from_edges(cls, num_vertices, src, dst, weights=None):
+        """Build from parallel edge arrays, the edges of a vertex keeping
+        their input order"""
+
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+
+        if len(src) != len(dst):
+            raise ValueError("src and dst must have the same length!")
+
+        if len(src) != 0 and (min(src.min(), dst.min()) < 0 or
+                              max(src.max(), dst.max()) >= num_vertices):
+            raise ValueError("Incorrect vertex!")
+
+        order = np.argsort(src, kind='stable')
+
+        indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=num_vertices), out=indptr[1:])
+
+        indices = dst[order].astype(cls._index_dtype(num_vertices))
+
+        if weights is not None:
+            weights = np.asarray(weights)[order]
+
+        return cls(indptr, indices, weights)
+
+    @property
+    def num_vertices(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.indices)
+
+    def neighbors(self, u):
+        """Out-neighbours of u, a view into indices"""
+
+        return self.indices[self.indptr[u]:self.indptr[u + 1]]
+
+    def edge_weights(self, u):
+
+        return self.weights[self.indptr[u]:self.indptr[u + 1]]
+
+    def out_degree(self):
+        return np.diff(self.indptr)
+
+    def in_degree(self):
+        return np.bincount(self.indices, minlength=self.num_vertices)
+
+    def sources(self):
+        """The source vertex of every edge, in edge order"""
+
+        return np.repeat(
+            np.arange(self.num_vertices, dtype=self.indices.dtype),
+            np.diff(self.indptr))
+
+    def reverse(self):
+        """The graph with every edge reversed, built once"""
+
+        if self._reverse is None:
+            self._reverse = CSRGraph.from_edges(self.num_vertices,
+                                                self.indices, self.sources(),
+                                                self.weights)
+            self._reverse._reverse = self
+
+        return self._reverse
+
+    def save(self, path):
+        """Write the graph, and its reverse if built, into directory path"""
+
+        os.makedirs(path, exist_ok=True)
+
+        for prefix, graph in [('', self), ('reverse_', self._reverse)]:
+            if graph is None:
+                continue
+
+            for name in self._ARRAYS:
+                array = getattr(graph, name)
+                if array is not None:
+                    np.save(os.path.join(path, prefix + name + '.npy'), array)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Open a graph written by save, memory-mapped by default"""
+
+        def load_graph(prefix):
+
+            arrays = {}
+
+            for name in cls._ARRAYS:
+                filename = os.path.join(path, prefix + name + '.npy')
+                if os.path.exists(filename):
+                    arrays[name] = np.load(filename, mmap_mode=mmap_mode)
+
+            if 'indptr' not in arrays:
+                return None
+
+            return cls(arrays['indptr'], arrays['indices'],
+                       arrays.get('weights'))
+
+        graph = load_graph('')
+
+        if graph is None:
+            raise ValueError("No graph saved in %s!" % path)
+
+        graph._reverse = load_graph('reverse_')
+
+        if graph._reverse is not None:
+            graph._reverse._reverse = graph
+
+        return graph
+
+    def _scratch_arrays(self):
+        """Distance and parent arrays of both search directions, allocated
+        once and handed back with every entry at -1"""
+
+        if self._scratch is None:
+            self._scratch = [
+                np.full(self.num_vertices, -1, dtype=self.indices.dtype)
+                for _ in range(4)
+            ]
+
+        return self._scratch
+
+    def _expand(self, frontier, dist, parent):
+        """Visit the unvisited out-neighbours of a BFS level at once, return
+        them as the next level"""
+
+        neighbors, sources = _top_down_step(self.indptr, self.indices,
+                                            frontier, dist)
+
+        if len(neighbors) != 0:
+            dist[neighbors] = dist[frontier[0]] + 1
+            parent[neighbors] = sources
+
+        return neighbors
+
+    def bi_search(self, src, dst):
+        """A shortest path from src to dst as a list of vertices, -1 if dst
+        is not reachable
+
+        Level-synchronous bidirectional BFS: the forward search follows the
+        edges, the backward one the reverse graph, and each round expands
+        the side whose frontier has fewer outgoing edges. A whole level is
+        expanded with a few numpy gathers, and a newly visited vertex meets
+        the other side when its distance there is set, an O(1) check. The
+        level is finished and the meeting vertex closest to the other end
+        kept, so the path is a shortest one.
+
+        The distance and parent arrays are allocated once per graph and only
+        the visited entries are reset, so a query costs
+        O(visited vertices + their edges), not O(V).
+        """
+
+        if not (0 <= src < self.num_vertices and 0 <= dst < self.num_vertices):
+            raise ValueError("Incorrect vertex!")
+
+        if src == dst:
+            return [src]
+
+        dist_f, dist_b, parent_f, parent_b = self._scratch_arrays()
+        reverse = self.reverse()
+
+        dtype = self.indices.dtype
+        frontier_f = np.array([src], dtype=dtype)
+        frontier_b = np.array([dst], dtype=dtype)
+        dist_f[src] = dist_b[dst] = 0
+
+        visited = [frontier_f, frontier_b]
+        meet = -1
+
+        def out_edges(graph, frontier):
+            return int((graph.indptr[frontier + 1] -
+                        graph.indptr[frontier]).sum())
+
+        try:
+            while len(frontier_f) != 0 and len(frontier_b) != 0:
+                if out_edges(self, frontier_f) <= out_edges(reverse,
+                                                            frontier_b):
+                    frontier_f = self._expand(frontier_f, dist_f, parent_f)
+                    new, dist_other = frontier_f, dist_b
+                else:
+                    frontier_b = reverse._expand(frontier_b, dist_b, parent_b)
+                    new, dist_other = frontier_b, dist_f
+
+                visited.append(new)
+
+                met = new[dist_other[new] != -1]
+
+                if len(met) != 0:
+                    meet = int(met[np.argmin(dist_other[met])])
+                    break
+
+            if meet == -1:
+                return -1
+
+            path = [meet]
+            while path[-1] != src:
+                path.append(int(parent_f[path[-1]]))
+            path.reverse()
+
+            while path[-1] != dst:
+                path.append(int(parent_b[path[-1]]))
+
+            return path
+
+        finally:
+            for vertices in visited:
+                dist_f[vertices] = dist_b[vertices] = -1
+                parent_f[vertices] = parent_b[vertices] = -1
+
+    def shortest_paths(self, srcs, dsts):
+        """bi_search for every pair (srcs[i], dsts[i]), reusing the same
+        scratch arrays"""
+
+        srcs = np.asarray(srcs).tolist()
+        dsts = np.asarray(dsts).tolist()
+
+        if len(srcs) != len(dsts):
+            raise ValueError("srcs and dsts must have the same length!")
+
+        return [self.bi_search(src, dst) for src, dst in zip(srcs, dsts)]
+
+    def bfs(self, sources, return_parents=False, processes=None, alpha=14,
+            beta=24):
+        """BFS level of every vertex from one or several sources, -1 for
+        the unreachable ones, and with return_parents a BFS tree as well
+        (parent of a source is itself, of an unreachable vertex -1)
+
+        Direction-optimizing BFS: a level is expanded top-down, visiting
+        the out-edges of the frontier, while the frontier is small, and
+        bottom-up, every unvisited vertex looking for a parent among its
+        in-edges in the reverse graph, once the frontier has more than
+        1/alpha of the edges left to check. Bottom-up stops at the first
+        parent found, which skips most edges of the large middle levels of
+        low-diameter graphs, and the search goes back to top-down when the
+        shrinking frontier has fewer than 1/beta of the vertices. The
+        frontier is a bitset during bottom-up levels, so a parent check is
+        one byte lookup.
+
+        With processes > 1, every level is split across a process pool
+        working on shared memory copies of the graph, see _BFSPool.
+        """
+
+        sources = np.unique(np.atleast_1d(np.asarray(sources)))
+
+        if len(sources) == 0 or sources[0] < 0 or \
+                sources[-1] >= self.num_vertices:
+            raise ValueError("Incorrect vertex!")
+
+        reverse = self.reverse()
+
+        workers = None
+        if processes is not None and processes > 1:
+            workers = _BFSPool(self, reverse, processes)
+
+        try:
+            return self._bfs(sources, reverse, workers, return_parents, alpha,
+                             beta)
+        finally:
+            if workers is not None:
+                workers.close()
+
+    def _bfs(self, sources, reverse, workers, return_parents, alpha, beta):
+
+        num_vertices = self.num_vertices
+        dtype = self.indices.dtype
+        indptr = self.indptr
+
+        if workers is None:
+            level = np.full(num_vertices, -1, dtype=dtype)
+            bits = np.zeros((num_vertices + 7) // 8, dtype=np.uint8)
+        else:
+            level, bits = workers.level, workers.bits
+
+        parent = np.full(num_vertices, -1, dtype=dtype)
+        in_degree = np.diff(reverse.indptr)
+
+        frontier = sources.astype(dtype)
+        level[frontier] = 0
+        parent[frontier] = frontier
+
+        # in-edges of the unvisited vertices, what bottom-up has to check
+        edges_left = reverse.num_edges - int(in_degree[frontier].sum())
+        bottom_up = False
+        depth = 0
+        prev_size = 0
+
+        while len(frontier) != 0:
+            if bottom_up:
+                bottom_up = not (len(frontier) < prev_size and
+                                 len(frontier) * beta < num_vertices)
+            else:
+                frontier_edges = int(
+                    (indptr[frontier + 1] - indptr[frontier]).sum())
+                bottom_up = frontier_edges * alpha > edges_left
+
+            if bottom_up:
+                mask = np.zeros(num_vertices, dtype=bool)
+                mask[frontier] = True
+                bits[:] = np.packbits(mask, bitorder='little')
+
+                if workers is None:
+                    found, parents = _bottom_up_step(reverse.indptr,
+                                                     reverse.indices, bits,
+                                                     level, 0, num_vertices)
+                else:
+                    found, parents = workers.bottom_up()
+            else:
+                if workers is None:
+                    found, parents = _top_down_step(indptr, self.indices,
+                                                    frontier, level)
+                else:
+                    found, parents = workers.top_down(frontier)
+
+            depth += 1
+            level[found] = depth
+            parent[found] = parents
+            edges_left -= int(in_degree[found].sum())
+
+            prev_size = len(frontier)
+            frontier = found
+
+        if workers is not None:
+            # the shared level array is freed with the pool
+            level = level.copy()
+
+        if return_parents:
+            return level, parent
+
+        return level
+
+    def _out_edges(self, u):
+        """(neighbors, weights) of u as lists, every weight 1 if the graph
+        is unweighted"""
+
+        start, end = int(self.indptr[u]), int(self.indptr[u + 1])
+        neighbors = self.indices[start:end].tolist()
+
+        if self.weights is None:
+            return neighbors, [1] * len(neighbors)
+
+        return neighbors, self.weights[start:end].tolist()
+
+    def _dijkstra_arrays(self):
+        """Distance, parent and queue handle lists of both search
+        directions, allocated once and always handed back reset"""
+
+        if self._dijkstra_scratch is None:
+            if self.weights is not None and len(self.weights) != 0 and \
+                    self.weights.min() < 0:
+                raise ValueError("Negative edge weights are not supported!")
+
+            num_vertices = self.num_vertices
+            self._dijkstra_scratch = [
+                [math.inf] * num_vertices, [-1] * num_vertices,
+                [-1] * num_vertices, [math.inf] * num_vertices,
+                [-1] * num_vertices, [-1] * num_vertices
+            ]
+
+        return self._dijkstra_scratch
+
+    @staticmethod
+    def _reset(touched, dist, parent, handle):
+
+        for v in touched:
+            dist[v] = math.inf
+            parent[v] = handle[v] = -1
+
+    def _check_vertex(self, *vertices):
+
+        for v in vertices:
+            if not 0 <= v < self.num_vertices:
+                raise ValueError("Incorrect vertex!")
+
+    def _search(self, src, dst, heuristic, dist, parent, handle, touched):
+        """Dijkstra, or A* with a heuristic, from src until dst is settled
+        or, with dst None, until every reachable vertex is"""
+
+        queue = PriorityQueue()
+        out_edges = self._out_edges
+
+        dist[src] = 0
+        touched.append(src)
+        handle[src] = queue.insert(0, src)
+
+        estimate = {} if heuristic is not None else None
+
+        while not queue.is_empty():
+            u, _ = queue.pop()
+            handle[u] = _SETTLED
+
+            if u == dst:
+                return
+
+            d = dist[u]
+
+            for v, w in zip(*out_edges(u)):
+                nd = d + w
+
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+
+                    priority = nd
+
+                    if estimate is not None:
+                        if v not in estimate:
+                            estimate[v] = heuristic(v)
+                        priority += estimate[v]
+
+                    if handle[v] == -1:
+                        touched.append(v)
+                        handle[v] = queue.insert(priority, v)
+                    elif handle[v] == _SETTLED:
+                        # only with an inconsistent heuristic, reopen v
+                        handle[v] = queue.insert(priority, v)
+                    else:
+                        queue.decrease_key(handle[v], priority)
+
+    @staticmethod
+    def _path(parent, src, dst):
+
+        path = [dst]
+
+        while path[-1] != src:
+            path.append(parent[path[-1]])
+
+        path.reverse()
+
+        return path
+
+    def dijkstra(self, src, dst):
+        """(distance, path) of a shortest weighted path, (inf, -1) if dst is
+        not reachable
+
+        The search stops as soon as dst is settled. Vertices are kept in an
+        indexed PriorityQueue and relaxed with decrease_key. Distances,
+        parents and queue handles live in lists allocated once per graph,
+        and only the entries touched by a query are reset afterwards, so a
+        query never pays O(V).
+        """
+
+        return self.astar(src, dst, None)
+
+    def astar(self, src, dst, heuristic):
+        """dijkstra guided by heuristic(v), a lower bound of the distance
+        from v to dst
+
+        With a consistent heuristic (h(u) <= w(u, v) + h(v)) every vertex is
+        settled at most once. A lower bound that is not consistent still
+        gives a shortest path, but a settled vertex reached again by a
+        shorter path is put back into the queue, which can cost more time.
+        """
+
+        self._check_vertex(src, dst)
+
+        dist, parent, handle = self._dijkstra_arrays()[:3]
+        touched = []
+
+        try:
+            self._search(src, dst, heuristic, dist, parent, handle, touched)
+
+            if dist[dst] == math.inf:
+                return math.inf, -1
+
+            return dist[dst], self._path(parent, src, dst)
+
+        finally:
+            self._reset(touched, dist, parent, handle)
+
+    def distances(self, src):
+        """Shortest distances from src to every vertex as a float64 array,
+        inf for the unreachable ones"""
+
+        self._check_vertex(src)
+
+        dist, parent, handle = self._dijkstra_arrays()[:3]
+        touched = []
+
+        try:
+            self._search(src, None, None, dist, parent, handle, touched)
+
+            ret = np.full(self.num_vertices, np.inf)
+            ret[touched] = [dist[v] for v in touched]
+
+            return ret
 
-        def one_step_bfs(queue, visited, edges, parents):
+        finally:
+            self._reset(touched, dist, parent, handle)
 
-            u = queue.popleft()
+    def bidirectional_dijkstra(self, src, dst):
+        """(distance, path) like dijkstra, searching from both ends
 
-            visited[u] = True
+        The forward search runs on the graph and the backward one on the
+        reverse graph, the side with the smaller queue minimum settling a
+        vertex each round. Every relaxation reaching a vertex already seen
+        by the other side updates the best path length mu, and the search
+        stops once the two queue minima add up to at least mu.
+        """
 
-            for v in edges[u]:
-                if not visited[v]:
-                    parents[v] = u
-                    queue.append(v)
+        self._check_vertex(src, dst)
 
-        def get_path(node, src_parents, dst_parents):
+        if src == dst:
+            return 0, [src]
 
-            to_path = [node]
+        (dist_f, parent_f, handle_f, dist_b, parent_b,
+         handle_b) = self._dijkstra_arrays()
+        reverse = self.reverse()
 
-            parent = dst_parents[node]
+        sides = [
+            (self._out_edges, dist_f, parent_f, handle_f, dist_b, []),
+            (reverse._out_edges, dist_b, parent_b, handle_b, dist_f, []),
+        ]
+        queues = [PriorityQueue(), PriorityQueue()]
 
-            while parent != -1:
-                to_path.append(parent)
-                parent = dst_parents[parent]
+        for (_, dist, _, handle, _, touched), queue, v in zip(
+                sides, queues, (src, dst)):
+            dist[v] = 0
+            touched.append(v)
+            handle[v] = queue.insert(0, v)
 
-            from_path = []
+        best, meet = math.inf, -1
 
-            parent = src_parents[node]
+        try:
+            while not queues[0].is_empty() and not queues[1].is_empty():
+                top_f, top_b = queues[0].peek()[1], queues[1].peek()[1]
 
-            while parent != -1:
-                from_path.append(parent)
-                parent = src_parents[parent]
+                if top_f + top_b >= best:
+                    break
 
-            return from_path[::-1] + to_path
+                side = 0 if top_f <= top_b else 1
+                out_edges, dist, parent, handle, dist_other, touched = sides[
+                    side]
+                queue = queues[side]
 
-        src_queue = deque()
-        dst_queue = deque()
+                u, d = queue.pop()
+                handle[u] = _SETTLED
 
-        src_parents = [None] * len(self.V)
-        dst_parents = [None] * len(self.V)
+                for v, w in zip(*out_edges(u)):
+                    nd = d + w
 
-        src_visited = [False] * len(self.V)
-        dst_visited = [False] * len(self.V)
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        parent[v] = u
 
-        src_parents[src] = -1
-        dst_parents[dst] = -1
+                        if handle[v] == -1:
+                            touched.append(v)
+                            handle[v] = queue.insert(nd, v)
+                        else:
+                            queue.decrease_key(handle[v], nd)
 
-        src_queue.append(src)
-        dst_queue.append(dst)
+                    if nd + dist_other[v] < best:
+                        best, meet = nd + dist_other[v], v
 
-        while len(src_queue) != 0 and len(dst_queue) != 0:
+            if meet == -1:
+                return math.inf, -1
 
-            one_step_bfs(src_queue, src_visited, self.edges, src_parents)
-            one_step_bfs(dst_queue, dst_visited, self.edges, dst_parents)
+            path = self._path(parent_f, src, meet)
 
-            node = intersect(src_visited, dst_visited)
+            while path[-1] != dst:
+                path.append(parent_b[path[-1]])
 
-            if node != -1:
-                return get_path(node, src_parents, dst_parents)
+            return best, path
 
-        return -1
+        finally:
+            for _, dist, parent, handle, _, touched in sides:
+                self._reset(touched, dist, parent, handle)
@@ -1,126 +1,718 @@
+import gc
+import math
+import time
+
+import numpy as np
+
+
 class HashTableChaining:
     """Hashtable with separate chaining
+
+    Resizing is incremental: the old bucket array is kept next to the new
+    one and every insert / search / remove first migrates a few buckets out
+    of it, so no single operation pays for rehashing the whole table. Until
+    the migration is over, lookups check the new array first and then the
+    part of the old one not yet migrated. The number of buckets per
+    operation is at least migrate_step, and is raised at each resize so
+    that the migration ends before enough operations can happen to cross
+    alpha_low or alpha_high again. Pass migrate_step=None to rehash
+    everything at once instead.
+
+    Empty buckets are None, so allocating a bucket array is one C-level
+    list fill rather than one list object per bucket.
+
+    An optional prefilter (a BloomFilter or CuckooFilter from
+    algo/approximate_membership.py) is kept in sync with the keys and
+    consulted first, so most misses never touch a chain. Every resize
+    builds a filter sized for the new table alongside the migration: it
+    receives the keys as their buckets move and replaces the current
+    filter once the migration is over.
     """
 
-    def __init__(self, size, alpha_low, alpha_high):
+    def __init__(self, size, alpha_low, alpha_high, migrate_step=4,
+                 prefilter=None):
         self._size = size
-        self._arr = [[] for _ in range(self._size)]
-        self._hash_function = lambda x: (3 * x + 1) % self._size
+        self._arr = [None] * self._size
+
+        self._old = None
+        self._old_size = 0
+        self._migrated = 0
+        self._migrate_step = migrate_step
+        self._step = migrate_step
+        self._prefilter = prefilter
+        # the filter of the keys already in the new bucket array
+        self._next_prefilter = None
 
         self.num_occupied = 0
         self._alpha_low = alpha_low
         self._alpha_high = alpha_high
 
+    def _hash_function(self, key, size):
+        return (3 * key + 1) % size
+
     def _resize(self, size):
-        tmp = self._arr
+        """Start moving the keys to a bucket array of the given size"""
+
+        self._finish_migration()
+
+        self._old = self._arr
+        self._old_size = self._size
+        self._migrated = 0
+
+        self._size = size
+        self._arr = [None] * size
+
+        if self._migrate_step is not None:
+            # at least this many operations until the next resize, and
+            # every one of them migrates _step buckets
+            num_ops = max(
+                min(self._alpha_high * size - self.num_occupied,
+                    self.num_occupied - self._alpha_low * size), 1)
+            self._step = max(self._migrate_step,
+                             math.ceil(self._old_size / num_ops) + 1)
 
-        self.__init__(size, self._alpha_low, self._alpha_high)
+        if self._prefilter is not None:
+            self._next_prefilter = self._prefilter.empty_like(
+                max(int(self._alpha_high * size), 1))
 
-        for val in [key for key in chain for chain in tmp]:
-            self.insert(val)
+        if self._migrate_step is None:
+            self._finish_migration()
+
+    def _migrate(self, num_buckets):
+
+        old = self._old
+        arr = self._arr
+        size = self._size
+        next_prefilter = self._next_prefilter
+
+        end = min(self._migrated + num_buckets, self._old_size)
+        moved = []
+
+        for i in range(self._migrated, end):
+            chain = old[i]
+
+            if chain is None:
+                continue
+
+            moved.extend(chain)
+
+            for key in chain:
+                hash_val = (3 * key + 1) % size
+                bucket = arr[hash_val]
+
+                if bucket is None:
+                    arr[hash_val] = [key]
+                else:
+                    bucket.append(key)
+
+            old[i] = None
+
+        self._migrated = end
+
+        if next_prefilter is not None:
+            if len(moved) > 64:
+                next_prefilter.add_many(moved)
+            else:
+                for key in moved:
+                    next_prefilter.add(key)
+
+        if end == self._old_size:
+            self._old = None
+
+            if next_prefilter is not None:
+                self._prefilter = next_prefilter
+                self._next_prefilter = None
+
+    def _finish_migration(self):
+
+        if self._old is not None:
+            self._migrate(self._old_size)
+
+    def _chain_of(self, key):
+        """Return the chain holding key, None if key is absent"""
+
+        chain = self._arr[self._hash_function(key, self._size)]
+
+        if chain is not None and key in chain:
+            return chain
+
+        if self._old is not None:
+            hash_val = self._hash_function(key, self._old_size)
+
+            if hash_val >= self._migrated:
+                chain = self._old[hash_val]
+
+                if chain is not None and key in chain:
+                    return chain
+
+        return None
 
     def insert(self, key):
-        hash_val = self._hash_function(key)
+
+        if self._old is not None:
+            self._migrate(self._step)
+
+        hash_val = self._hash_function(key, self._size)
 
         # for linkedlist, we insert at front
         # for array, we insert at the back
-        self._arr[hash_val].append(key)
+        bucket = self._arr[hash_val]
+
+        if bucket is None:
+            self._arr[hash_val] = [key]
+        else:
+            bucket.append(key)
+
         self.num_occupied += 1
 
+        if self._prefilter is not None:
+            self._prefilter.add(key)
+        if self._next_prefilter is not None:
+            self._next_prefilter.add(key)
+
         if self.num_occupied / self._size > self._alpha_high:
             self._resize(self._size * 2)
 
     def search(self, key):
 
-        hash_val = self._hash_function(key)
+        if self._old is not None:
+            self._migrate(self._step)
+
+        if self._prefilter is not None and not self._prefilter.might_contain(
+                key):
+            return False
 
-        return key in self._arr[hash_val]
+        return self._chain_of(key) is not None
 
     def remove(self, key):
 
-        hash_val = self._hash_function(key)
+        if self._old is not None:
+            self._migrate(self._step)
 
-        if key in self._arr[hash_val]:
+        chain = self._chain_of(key)
+
+        if chain is not None:
             # this is costly
-            self._arr[hash_val].remove(key)
+            chain.remove(key)
             self.num_occupied -= 1
 
-            if self.num_occupied / self._size < self._alpha_low:
+            if self._prefilter is not None:
+                self._prefilter.remove(key)
+
+            # the next filter only holds the keys of the new bucket array
+            if (self._next_prefilter is not None and
+                    chain is self._arr[self._hash_function(key, self._size)]):
+                self._next_prefilter.remove(key)
+
+            if (self.num_occupied / self._size < self._alpha_low and
+                    self._size > 1):
                 self._resize(self._size // 2)
 
+    def _hash_many(self, keys):
+        """_hash_function over a whole numpy array of keys at once"""
+
+        # reduce first so that 3 * key can not overflow int64
+        keys = np.asarray(keys, dtype=np.int64) % self._size
+
+        return ((3 * keys + 1) % self._size).tolist()
+
+    def insert_many(self, keys):
+
+        keys = np.asarray(keys, dtype=np.int64)
+
+        self._finish_migration()
+
+        self.num_occupied += len(keys)
+
+        # grow once to the final size instead of once per threshold crossed,
+        # and before inserting so the keys go straight to the new array
+        size = self._size
+        while self.num_occupied / size > self._alpha_high:
+            size *= 2
+
+        if size != self._size:
+            self._resize(size)
+
+        arr = self._arr
+
+        for key, hash_val in zip(keys.tolist(), self._hash_many(keys)):
+            bucket = arr[hash_val]
+
+            if bucket is None:
+                arr[hash_val] = [key]
+            else:
+                bucket.append(key)
+
+        if self._prefilter is not None:
+            self._prefilter.add_many(keys)
+        if self._next_prefilter is not None:
+            self._next_prefilter.add_many(keys)
+
+    def contains_many(self, keys):
+        """Return a bool array telling which keys are present"""
+
+        keys = np.asarray(keys, dtype=np.int64)
+
+        self._finish_migration()
+
+        ret = np.zeros(len(keys), dtype=bool)
+        candidates = np.arange(len(keys))
+
+        if self._prefilter is not None:
+            candidates = np.flatnonzero(self._prefilter.might_contain_many(keys))
+
+        arr = self._arr
+
+        ret[candidates] = np.fromiter(
+            (arr[hash_val] is not None and key in arr[hash_val]
+             for key, hash_val in zip(keys[candidates].tolist(),
+                                      self._hash_many(keys[candidates]))),
+            dtype=bool,
+            count=len(candidates))
+
+        return ret
+
+    def remove_many(self, keys):
+        """Remove one occurrence of each key, return which were present"""
+
+        keys = np.asarray(keys, dtype=np.int64)
+
+        self._finish_migration()
+
+        arr = self._arr
+        removed = np.zeros(len(keys), dtype=bool)
+
+        for i, (key, hash_val) in enumerate(
+                zip(keys.tolist(), self._hash_many(keys))):
+            chain = arr[hash_val]
+            if chain is not None and key in chain:
+                chain.remove(key)
+                removed[i] = True
+
+                if self._prefilter is not None:
+                    self._prefilter.remove(key)
+
+        self.num_occupied -= int(np.count_nonzero(removed))
+
+        size = self._size
+        while size > 1 and self.num_occupied / size < self._alpha_low:
+            size //= 2
+
+        if size != self._size:
+            self._resize(size)
+
+        return removed
+
 
 class HashtableOpenAddressing:
-    """Hashtable with open addressing (linear probing)
-    
-    Assume keys are positive
+    """Hashtable with open addressing (linear probing) for integer keys
 
-    Use lazy deletion, use -1 to denote deleted
+    Keys, values and slot states live in parallel numpy arrays whose
+    capacity is a power of two, probing wraps around the end of the array.
+    Keys are hashed with Fibonacci (multiplicative) hashing, which also
+    vectorizes over numpy arrays when the table is rebuilt.
+
+    Deletion is lazy: the slot becomes a tombstone that lookups probe past
+    and inserts may reuse. When live slots plus tombstones exceed alpha_high,
+    the table is rebuilt, at twice the size if live slots alone exceed it,
+    at the same size otherwise, which drops all the tombstones.
+
+    Pass value_dtype to use the table as a map, without it the table is a
+    set of keys and no value array is allocated.
+
+    An optional prefilter (a BloomFilter or CuckooFilter from
+    algo/approximate_membership.py) is kept in sync with the keys and
+    consulted first, so most misses never walk a probe sequence. It is
+    rebuilt for the new capacity on every resize.
     """
 
-    def __init__(self, size, alpha_low, alpha_high):
-        self._size = size
-        self._arr = [None] * size
-        self._hash_function = lambda x: (3 * x + 1) % self._size
+    EMPTY = 0
+    FULL = 1
+    DELETED = 2
+
+    _MIN_CAPACITY = 8
+    _MULTIPLIER = 0x9E3779B97F4A7C15
+    _MASK64 = (1 << 64) - 1
+
+    def __init__(self, size=8, alpha_low=0.125, alpha_high=0.5,
+                 value_dtype=None, prefilter=None):
+
+        if not 0 <= alpha_low < alpha_high / 2 or alpha_high >= 1:
+            raise ValueError("Need 0 <= alpha_low < alpha_high / 2, alpha_high < 1!")
 
-        self.num_occupied = 0
         self._alpha_low = alpha_low
         self._alpha_high = alpha_high
+        self._value_dtype = value_dtype
+        self._prefilter = prefilter
 
-    def _resize(self, size):
+        self._allocate(self._capacity_for(size))
 
-        tmp = self._arr
+    def _capacity_for(self, size):
+        return max(HashtableOpenAddressing._MIN_CAPACITY,
+                   1 << (max(size, 1) - 1).bit_length())
 
-        self.__init__(size, self._alpha_low, self._alpha_high)
+    def _allocate(self, capacity):
 
-        for key in tmp:
-            if key is None or key == -1:
-                continue
+        self._size = capacity
+        self._mask = capacity - 1
+        self._shift = 64 - (capacity.bit_length() - 1)
 
-            hash_val = self._hash_function(key)
+        self._keys = np.zeros(capacity, dtype=np.int64)
+        self._states = np.zeros(capacity, dtype=np.uint8)
+        self._values = None if self._value_dtype is None else np.zeros(
+            capacity, dtype=self._value_dtype)
 
-            while self._arr[hash_val] is not None:
-                hash_val += 1
+        self.num_occupied = 0
+        self.num_deleted = 0
 
-            self._arr[hash_val] = key
+    def __len__(self):
+        return self.num_occupied
 
-    def insert(self, key):
+    def __contains__(self, key):
+        return self.search(key)
+
+    def _hash_function(self, key):
+
+        # numpy integers, such as the keys handed out by items, can not be
+        # masked with a python int wider than 64 bits
+        key = int(key)
+
+        return (((key & HashtableOpenAddressing._MASK64) *
+                 HashtableOpenAddressing._MULTIPLIER) &
+                HashtableOpenAddressing._MASK64) >> self._shift
+
+    def _hash_many(self, keys):
+        """Vectorized _hash_function, uint64 multiplication wraps around"""
 
-        hash_val = self._hash_function(key)
+        return ((keys.astype(np.uint64) *
+                 np.uint64(HashtableOpenAddressing._MULTIPLIER)) >> np.uint64(
+                     self._shift)).astype(np.intp)
+
+    def _find(self, key):
+        """Probe for key
+
+        Return (True, slot of key) if present, otherwise (False, slot where
+        key should be inserted), reusing the first tombstone on the way.
+        """
+
+        keys = self._keys
+        states = self._states
+        mask = self._mask
+
+        idx = self._hash_function(key)
+        first_deleted = -1
 
         while True:
+            state = states[idx]
 
-            val = self._arr[hash_val]
+            if state == HashtableOpenAddressing.EMPTY:
+                return False, idx if first_deleted == -1 else first_deleted
+            if state == HashtableOpenAddressing.FULL:
+                if keys[idx] == key:
+                    return True, idx
+            elif first_deleted == -1:
+                first_deleted = idx
 
-            if val is not None and val != -1:
-                hash_val += 1
-            else:
-                break
+            idx = (idx + 1) & mask
 
-        self._arr[hash_val] = key
-        self.num_occupied += 1
+    def _place_many(self, keys, values):
+        """Insert keys known to be distinct and absent, in batched rounds
 
-        if self.num_occupied / self._size > self._alpha_high:
+        Each round every pending key looks at its current probe slot; the
+        first key of each free slot claims it and the others move on.
+        """
+
+        states = self._states
+        slots = self._hash_many(keys)
+        pending = np.arange(len(keys))
+
+        while pending.size != 0:
+            free = states[slots] != HashtableOpenAddressing.FULL
+            _, first = np.unique(slots[free], return_index=True)
+            claimed = np.flatnonzero(free)[first]
+
+            won = slots[claimed]
+            self.num_deleted -= int(
+                np.count_nonzero(states[won] == HashtableOpenAddressing.DELETED))
+            states[won] = HashtableOpenAddressing.FULL
+            self._keys[won] = keys[pending[claimed]]
+            if self._values is not None:
+                self._values[won] = values[pending[claimed]]
+
+            lost = np.ones(len(pending), dtype=bool)
+            lost[claimed] = False
+            pending = pending[lost]
+            slots = (slots[lost] + 1) & self._mask
+
+        self.num_occupied += len(keys)
+
+    def _find_many(self, keys):
+        """Vectorized _find for distinct keys, probing in batched rounds
+
+        Return (found, slots) where slots[i] is the slot of keys[i] if
+        found[i], otherwise unspecified.
+        """
+
+        keys_table = self._keys
+        states = self._states
+
+        found = np.zeros(len(keys), dtype=bool)
+        slots = self._hash_many(keys)
+        ret_slots = np.zeros(len(keys), dtype=np.intp)
+        pending = np.arange(len(keys))
+
+        while pending.size != 0:
+            state = states[slots]
+            hit = ((state == HashtableOpenAddressing.FULL) &
+                   (keys_table[slots] == keys[pending]))
+
+            found[pending[hit]] = True
+            ret_slots[pending[hit]] = slots[hit]
+
+            more = ~hit & (state != HashtableOpenAddressing.EMPTY)
+            pending = pending[more]
+            slots = (slots[more] + 1) & self._mask
+
+        return found, ret_slots
+
+    def _resize(self, size):
+
+        full = self._states == HashtableOpenAddressing.FULL
+        keys = self._keys[full]
+        values = None if self._values is None else self._values[full]
+
+        self._allocate(self._capacity_for(size))
+        self._place_many(keys, values)
+
+        if self._prefilter is not None:
+            self._prefilter = self._prefilter.empty_like(
+                int(self._alpha_high * self._size))
+            self._prefilter.add_many(keys)
+
+    def _maybe_resize(self):
+
+        if self.num_occupied > self._alpha_high * self._size:
             self._resize(self._size * 2)
+        elif self.num_occupied + self.num_deleted > self._alpha_high * self._size:
+            self._resize(self._size)
+        elif (self.num_occupied < self._alpha_low * self._size and
+              self._size > HashtableOpenAddressing._MIN_CAPACITY):
+            self._resize(self._size // 2)
+
+    def insert(self, key, val=None):
+        """Insert key, or overwrite its value if it is already present"""
+
+        found, idx = self._find(key)
+
+        if not found:
+            if self._states[idx] == HashtableOpenAddressing.DELETED:
+                self.num_deleted -= 1
+            self._states[idx] = HashtableOpenAddressing.FULL
+            self._keys[idx] = key
+            self.num_occupied += 1
+
+            if self._prefilter is not None:
+                self._prefilter.add(key)
+
+        if self._values is not None:
+            self._values[idx] = val
+
+        if not found:
+            self._maybe_resize()
 
     def search(self, key):
 
-        hash_val = self._hash_function(key)
+        if self._prefilter is not None and not self._prefilter.might_contain(
+                key):
+            return False
+
+        return self._find(key)[0]
+
+    def get(self, key, default=None):
+
+        if self._values is None:
+            raise ValueError("Table was created without values!")
 
-        while self._arr[hash_val] is not None:
-            if self._arr[hash_val] == key:
-                return True
+        if self._prefilter is not None and not self._prefilter.might_contain(
+                key):
+            return default
 
-        return False
+        found, idx = self._find(key)
+
+        return self._values[idx] if found else default
 
     def remove(self, key):
+        """Remove key, return whether it was present"""
+
+        found, idx = self._find(key)
+
+        if not found:
+            return False
+
+        self._states[idx] = HashtableOpenAddressing.DELETED
+        self.num_occupied -= 1
+        self.num_deleted += 1
+
+        if self._prefilter is not None:
+            self._prefilter.remove(key)
+
+        self._maybe_resize()
+
+        return True
+
+    def insert_many(self, keys, values=None):
+        """Vectorized insert, for repeated keys the last value wins"""
+
+        keys = np.asarray(keys, dtype=np.int64)
+
+        if keys.size == 0:
+            return
+
+        size = len(keys)
+        keys, last = np.unique(keys[::-1], return_index=True)
+
+        if self._values is not None:
+            values = np.broadcast_to(
+                np.asarray(values, dtype=self._values.dtype), (size, ))
+            values = values[::-1][last]
+
+        found, slots = self._find_many(keys)
+
+        if self._values is not None:
+            self._values[slots[found]] = values[found]
+
+        new_keys = keys[~found]
+        new_values = None if self._values is None else values[~found]
+
+        expected = self.num_occupied + len(new_keys)
+
+        if expected + self.num_deleted > self._alpha_high * self._size:
+            self._resize(int(np.ceil(expected / self._alpha_high)) + 1)
+
+        self._place_many(new_keys, new_values)
+
+        if self._prefilter is not None:
+            self._prefilter.add_many(new_keys)
+
+    def contains_many(self, keys):
+        """Return a bool array telling which keys are present"""
+
+        keys = np.asarray(keys, dtype=np.int64)
+
+        unique, inverse = np.unique(keys, return_inverse=True)
+        found = np.zeros(len(unique), dtype=bool)
+        candidates = np.arange(len(unique))
+
+        if self._prefilter is not None:
+            candidates = np.flatnonzero(
+                self._prefilter.might_contain_many(unique))
+
+        found[candidates] = self._find_many(unique[candidates])[0]
+
+        return found[inverse.reshape(keys.shape)]
+
+    def remove_many(self, keys):
+        """Vectorized remove, return a bool array of the keys that were present"""
+
+        keys = np.asarray(keys, dtype=np.int64)
+
+        unique, inverse = np.unique(keys, return_inverse=True)
+        found, slots = self._find_many(unique)
+
+        self._states[slots[found]] = HashtableOpenAddressing.DELETED
+        self.num_occupied -= int(np.count_nonzero(found))
+        self.num_deleted += int(np.count_nonzero(found))
+
+        if self._prefilter is not None:
+            for key in unique[found].tolist():
+                self._prefilter.remove(key)
+
+        size = self._size
+        while (size > HashtableOpenAddressing._MIN_CAPACITY and
+               self.num_occupied < self._alpha_low * size):
+            size //= 2
+
+        if (size != self._size or
+                self.num_occupied + self.num_deleted > self._alpha_high * size):
+            self._resize(size)
+
+        return found[inverse.reshape(keys.shape)]
+
+    def keys(self):
+        """The keys as python ints, in slot order"""
+
+        full = self._states == HashtableOpenAddressing.FULL
+
+        return iter(self._keys[full].tolist())
+
+    def items(self):
+        """(key, value) pairs as python objects, value None without a value
+        array"""
+
+        full = self._states == HashtableOpenAddressing.FULL
+        keys = self._keys[full].tolist()
+
+        if self._values is None:
+            return ((key, None) for key in keys)
+
+        return zip(keys, self._values[full].tolist())
+
+
+def latency_percentiles(latencies):
+    """(p50, p99, p999, max) of latencies in nanoseconds, in microseconds"""
+
+    return tuple(np.percentile(latencies, [50, 99, 99.9, 100]) / 1000)
+
+
+def time_operations(table, keys, rng):
+    """Time every single operation of a workload that grows the table with
+    all the keys, then shrinks it back by removing them, each insert or
+    remove being followed by a search of a random key inserted so far, so
+    that searches and removes also run during migrations
+
+    Return the latencies in nanoseconds of every insert, search and remove.
+    """
+
+    clock = time.perf_counter_ns
+    latencies = {"insert": [], "search": [], "remove": []}
+
+    def timed(name, operation, key):
+        start = clock()
+        operation(key)
+        latencies[name].append(clock() - start)
+
+    for i, key in enumerate(keys):
+        timed("insert", table.insert, key)
+        timed("search", table.search, keys[rng.randrange(i + 1)])
+
+    order = list(keys)
+    rng.shuffle(order)
+
+    for key in order:
+        timed("remove", table.remove, key)
+        timed("search", table.search, keys[rng.randrange(len(keys))])
+
+    return latencies
+
+
+if __name__ == "__main__":
+
+    import random
+
+    keys = np.unique(np.random.randint(0, 2**62, size=2**20)).tolist()
 
-        hash_val = self._hash_function(key)
+    # cyclic gc pauses would otherwise dominate the tail for both tables
+    gc.disable()
 
-        while self._arr[hash_val] is not None:
-            if self._arr[hash_val] == key:
-                self._arr[hash_val] = -1
+    print("latency (us)")
+    print("%24s %8s %10s %10s %10s %10s" %
+          ("", "", "p50", "p99", "p999", "max"))
 
-                self.num_occupied -= 1
+    for name, migrate_step in [("stop-the-world", None), ("incremental", 4)]:
+        table = HashTableChaining(8, 0.1, 1.0, migrate_step=migrate_step)
+        latencies = time_operations(table, keys, random.Random(0))
 
-                if self.num_occupied / self._size < self._alpha_low:
-                    self._resize(self._size // 2)
+        for operation in ["insert", "search", "remove"]:
+            print("%24s %8s %10.2f %10.2f %10.2f %10.2f" %
+                  (name, operation,
+                   *latency_percentiles(latencies[operation])))
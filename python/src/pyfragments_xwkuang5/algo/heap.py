@@ -0,0 +1,422 @@
+import heapq
+import operator
+import time
+from array import array
+from functools import partial
+from itertools import count
+
+import numpy as np
+
+# the max-heap variants are public from python 3.14 on, and were private,
+# but C-accelerated, helpers of heapq before
+_heapify_max = getattr(heapq, 'heapify_max', None) or heapq._heapify_max
+_heappop_max = getattr(heapq, 'heappop_max', None) or heapq._heappop_max
+_heapreplace_max = (getattr(heapq, 'heapreplace_max', None) or
+                    heapq._heapreplace_max)
+
+
+def _heappush_max(heap, item):
+
+    heap.append(item)
+    heapq._siftdown_max(heap, 0, len(heap) - 1)
+
+
+_heappush_max = getattr(heapq, 'heappush_max', _heappush_max)
+
+
+def _heappushpop_max(heap, item):
+
+    if heap and item < heap[0]:
+        return _heapreplace_max(heap, item)
+
+    return item
+
+
+_heappushpop_max = getattr(heapq, 'heappushpop_max', _heappushpop_max)
+
+
+def _use_bulk(num_new, size):
+    """Whether rebuilding a heap of size + num_new entries in linear time
+    beats num_new logarithmic operations"""
+
+    return num_new * (size + num_new).bit_length() > size + num_new
+
+
+class Heap:
+    """A binary min or max heap over a python list, driven by heapq
+
+    Every operation is a single call into the C implementation of heapq.
+    Without a key function, push, pop, peek, pushpop and replace are bound
+    to the list as functools.partial objects when the heap is created, so
+    calling them costs about as much as calling heapq directly. With a key
+    function the list holds (key(item), seq, item) entries, the
+    sequence number breaking ties in insertion order so items never have to
+    be comparable. Iterating the heap yields the items in heap order, not
+    sorted.
+
+        construction from n items: O(n)
+        push, pop, pushpop, replace: O(log(n))
+        push_many of m items: O(min(m * log(n + m), n + m))
+        pop_many of k items: O(min(k * log(n), n * log(n)))
+    """
+
+    def __init__(self, iterable=(), min_heap=True, key=None):
+
+        self._min_heap = min_heap
+        self._key = key
+        self._counter = count()
+
+        if min_heap:
+            self._heapify = heapq.heapify
+            self._heappush = heapq.heappush
+            self._heappop = heapq.heappop
+            self._heapreplace = heapq.heapreplace
+            self._heappushpop = heapq.heappushpop
+        else:
+            self._heapify = _heapify_max
+            self._heappush = _heappush_max
+            self._heappop = _heappop_max
+            self._heapreplace = _heapreplace_max
+            self._heappushpop = _heappushpop_max
+
+        self._arr = [self._entry(item) for item in iterable
+                    ] if key is not None else list(iterable)
+
+        self._heapify(self._arr)
+
+        if key is None:
+            # shadow the generic methods, the list is never rebound
+            arr = self._arr
+            self.push = partial(self._heappush, arr)
+            self.pop = partial(self._heappop, arr)
+            self.peek = partial(operator.getitem, arr, 0)
+            self.pushpop = partial(self._heappushpop, arr)
+            self.replace = partial(self._heapreplace, arr)
+
+    def _entry(self, item):
+
+        seq = next(self._counter)
+
+        # in a max heap the larger sequence number wins, negate it so ties
+        # still come out in insertion order
+        return (self._key(item), seq if self._min_heap else -seq, item)
+
+    def __len__(self):
+        return len(self._arr)
+
+    def __bool__(self):
+        return len(self._arr) != 0
+
+    def __iter__(self):
+
+        if self._key is None:
+            return iter(self._arr)
+
+        return (entry[2] for entry in self._arr)
+
+    def peek(self):
+
+        if not self._arr:
+            raise IndexError("Can not peek into an empty heap")
+
+        return self._arr[0] if self._key is None else self._arr[0][2]
+
+    def push(self, item):
+
+        if self._key is None:
+            self._heappush(self._arr, item)
+        else:
+            self._heappush(self._arr, self._entry(item))
+
+    def pop(self):
+
+        if not self._arr:
+            raise IndexError("Can not pop element from empty heap")
+
+        if self._key is None:
+            return self._heappop(self._arr)
+
+        return self._heappop(self._arr)[2]
+
+    def pushpop(self, item):
+        """Push item then pop the top, faster than push followed by pop"""
+
+        if self._key is None:
+            return self._heappushpop(self._arr, item)
+
+        return self._heappushpop(self._arr, self._entry(item))[2]
+
+    def replace(self, item):
+        """Pop the top then push item, the heap must not be empty"""
+
+        if not self._arr:
+            raise IndexError("Can not replace the top of an empty heap")
+
+        if self._key is None:
+            return self._heapreplace(self._arr, item)
+
+        return self._heapreplace(self._arr, self._entry(item))[2]
+
+    def push_many(self, items):
+        """Push every item, re-heapifying once when that is cheaper"""
+
+        if self._key is not None:
+            items = [self._entry(item) for item in items]
+        elif not isinstance(items, list):
+            items = list(items)
+
+        if _use_bulk(len(items), len(self._arr)):
+            self._arr.extend(items)
+            self._heapify(self._arr)
+        else:
+            push, arr = self._heappush, self._arr
+            for item in items:
+                push(arr, item)
+
+    def pop_many(self, k):
+        """Pop the top k items, in order"""
+
+        if k > len(self._arr):
+            raise IndexError("Can not pop more elements than the heap has")
+
+        arr = self._arr
+
+        if 4 * k < len(arr):
+            pop = self._heappop
+            ret = [pop(arr) for _ in range(k)]
+        else:
+            # a sorted list is a valid heap, keep the tail as the new heap
+            arr.sort(reverse=not self._min_heap)
+            ret = arr[:k]
+            del arr[:k]
+
+        return ret if self._key is None else [entry[2] for entry in ret]
+
+
+class NumericHeap:
+    """A binary min or max heap of numbers stored in an array.array
+
+    Values are kept unboxed, 8 bytes each for the default float64 instead of
+    a pointer and a float object in a list, and the bulk operations work on
+    a zero-copy numpy view of the array: a sorted array is a valid heap, so
+    construction, large push_many and large pop_many are one numpy sort. A
+    max heap stores the negated values, so only signed integer and float
+    dtypes are supported.
+
+    Single pushes and pops sift in python and are slower than Heap, use
+    this heap for large numeric data fed and drained in batches.
+    """
+
+    def __init__(self, values=(), min_heap=True, dtype=np.float64):
+
+        dtype = np.dtype(dtype)
+
+        if dtype.kind not in 'if':
+            raise ValueError("Only signed integer and float dtypes are "
+                             "supported!")
+
+        self._dtype = dtype
+        self._sign = 1 if min_heap else -1
+        self._arr = array(dtype.char)
+
+        self.push_many(values)
+
+    def __len__(self):
+        return len(self._arr)
+
+    def __bool__(self):
+        return len(self._arr) != 0
+
+    def _view(self):
+        # never keep the view around, an exported array can not grow
+        return np.frombuffer(self._arr, dtype=self._dtype)
+
+    def peek(self):
+
+        if not self._arr:
+            raise IndexError("Can not peek into an empty heap")
+
+        return self._sign * self._arr[0]
+
+    def push(self, value):
+
+        self._arr.append(0)
+        self._sift_up(len(self._arr) - 1, self._sign * value)
+
+    def pop(self):
+
+        arr = self._arr
+
+        if not arr:
+            raise IndexError("Can not pop element from empty heap")
+
+        last = arr.pop()
+
+        if not arr:
+            return self._sign * last
+
+        ret = arr[0]
+        self._sift_down(0, last)
+
+        return self._sign * ret
+
+    def pushpop(self, value):
+
+        value = self._sign * value
+
+        if self._arr and self._arr[0] < value:
+            ret = self._arr[0]
+            self._sift_down(0, value)
+            return self._sign * ret
+
+        return self._sign * value
+
+    def replace(self, value):
+
+        if not self._arr:
+            raise IndexError("Can not replace the top of an empty heap")
+
+        ret = self._arr[0]
+        self._sift_down(0, self._sign * value)
+
+        return self._sign * ret
+
+    def push_many(self, values):
+
+        values = np.asarray(values, dtype=self._dtype) * self._sign
+
+        if _use_bulk(len(values), len(self._arr)):
+            values = np.concatenate([self._view(), values])
+            values.sort()
+            self._arr = array(self._dtype.char, values.tobytes())
+        else:
+            for value in values.tolist():
+                self._arr.append(0)
+                self._sift_up(len(self._arr) - 1, value)
+
+    def pop_many(self, k):
+        """Pop the top k values, in order, as a numpy array"""
+
+        if k > len(self._arr):
+            raise IndexError("Can not pop more elements than the heap has")
+
+        if 4 * k < len(self._arr):
+            return np.array([self.pop() for _ in range(k)], dtype=self._dtype)
+
+        values = self._view().copy()
+        values.sort()
+        self._arr = array(self._dtype.char, values[k:].tobytes())
+
+        return values[:k] * self._sign
+
+    def _sift_up(self, i, value):
+
+        arr = self._arr
+
+        while i > 0:
+            parent = (i - 1) >> 1
+
+            if not value < arr[parent]:
+                break
+
+            arr[i] = arr[parent]
+            i = parent
+
+        arr[i] = value
+
+    def _sift_down(self, i, value):
+
+        arr = self._arr
+        size = len(arr)
+
+        while True:
+            child = 2 * i + 1
+
+            if child >= size:
+                break
+
+            if child + 1 < size and arr[child + 1] < arr[child]:
+                child += 1
+
+            if not arr[child] < value:
+                break
+
+            arr[i] = arr[child]
+            i = child
+
+        arr[i] = value
+
+
+if __name__ == "__main__":
+
+    n = 1 << 18
+    k = 1 << 10
+
+    rng = np.random.default_rng(0)
+    data = rng.random(n)
+    values = data.tolist()
+
+    def bench(name, func):
+
+        start = time.perf_counter()
+        func()
+        print("%40s %10.4f" % (name, time.perf_counter() - start))
+
+    def heapq_push_pop():
+
+        heap = []
+        for value in values:
+            heapq.heappush(heap, value)
+        for _ in range(n):
+            heapq.heappop(heap)
+
+    def heap_push_pop(heap_type):
+
+        heap = heap_type()
+        for value in values:
+            heap.push(value)
+        for _ in range(n):
+            heap.pop()
+
+    def heapq_top_k():
+
+        heap = values[:k]
+        heapq.heapify(heap)
+        for value in values[k:]:
+            if value > heap[0]:
+                heapq.heapreplace(heap, value)
+
+    def heap_top_k(heap_type):
+
+        heap = heap_type(values[:k])
+        top = heap.peek()
+        for value in values[k:]:
+            if value > top:
+                heap.replace(value)
+                top = heap.peek()
+
+    print("%d values, seconds" % n)
+
+    bench("heapq push + pop", heapq_push_pop)
+    bench("Heap push + pop", lambda: heap_push_pop(Heap))
+    bench("NumericHeap push + pop", lambda: heap_push_pop(NumericHeap))
+
+    bench("heapq top %d" % k, heapq_top_k)
+    bench("Heap top %d" % k, lambda: heap_top_k(Heap))
+
+    def heapq_drain():
+
+        heap = values[:]
+        heapq.heapify(heap)
+        return [heapq.heappop(heap) for _ in range(n)]
+
+    bench("heapq heapify + pop n", heapq_drain)
+    bench("Heap(values).pop_many(n)", lambda: Heap(values).pop_many(n))
+    bench("NumericHeap(data).pop_many(n)",
+          lambda: NumericHeap(data).pop_many(n))
+
+    bench("heapq.nlargest %d" % k, lambda: heapq.nlargest(k, values))
+    bench("Heap(values, max).pop_many(%d)" % k,
+          lambda: Heap(values, min_heap=False).pop_many(k))
+    bench("NumericHeap(data, max).pop_many(%d)" % k,
+          lambda: NumericHeap(data, min_heap=False).pop_many(k))
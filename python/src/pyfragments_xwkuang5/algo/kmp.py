@@ -1,3 +1,11 @@
+import mmap
+import random
+import re
+import time
+
+_BYTES_LIKE = (bytes, bytearray, memoryview, mmap.mmap)
+
+
 def partial_match_table(string):
     pmt = [0] * len(string)
 
@@ -19,9 +27,22 @@ def partial_match_table(string):
 
 
 def kmp_match(string, pattern):
+    """Start offsets of every, possibly overlapping, match of pattern
+
+    Bytes-like inputs (bytes, bytearray, memoryview, mmap) take a fast path
+    that skips to the candidate positions in C, see _kmp_scan_bytes.
+    """
+
     pmt = partial_match_table(pattern)
 
-    print(pmt)
+    if (len(pattern) > 0 and isinstance(string, _BYTES_LIKE) and
+            isinstance(pattern, _BYTES_LIKE)):
+        return _kmp_scan_bytes(string, bytes(pattern), pmt, 0, 0)[0]
+
+    return _kmp_match_generic(string, pattern, pmt)
+
+
+def _kmp_match_generic(string, pattern, pmt):
 
     match_location = []
 
@@ -50,7 +71,208 @@ def kmp_match(string, pattern):
     return match_location
 
 
-text = "AABAACAADAABAABA"
-pattern = "AABA"
+def _kmp_scan(text, pattern, pmt, j, offset):
+    """Run KMP over text, starting with j pattern symbols matched
+
+    Return the start offsets of the matches, shifted by offset, and the
+    number of pattern symbols matched at the end of text.
+    """
+
+    size = len(pattern)
+    start = offset - size + 1
+
+    matches = []
+
+    for i, ch in enumerate(text):
+        while j > 0 and ch != pattern[j]:
+            j = pmt[j - 1]
+
+        if ch == pattern[j]:
+            j += 1
+
+            if j == size:
+                matches.append(start + i)
+                j = pmt[j - 1]
+
+    return matches, j
+
+
+def _first_byte_finder(text, first):
+    """Return find(start), the position of the next byte equal to first at
+    or after start, -1 if there is none. Zero-copy for every input."""
+
+    if isinstance(text, memoryview):
+        # memoryview has no find, but re scans any buffer in place
+        search = re.compile(re.escape(bytes((first, )))).search
+
+        def find(start):
+            match = search(text, start)
+            return -1 if match is None else match.start()
+
+        return find
+
+    needle = bytes((first, ))
+    text_find = text.find
+
+    return lambda start: text_find(needle, start)
+
+
+def _kmp_scan_bytes(text, pattern, pmt, j, offset):
+    """Run KMP over a bytes-like text, starting with j pattern bytes matched
+
+    Same as _kmp_scan, but whenever no prefix of the pattern is matched,
+    the next occurrence of the first pattern byte is located with a C-level
+    find (memchr for bytes, bytearray and mmap), and the python loop only
+    runs from there until the partial match is lost again. On texts where
+    the first byte is rare, most of the input is never touched from python.
+    """
+
+    if isinstance(text, memoryview):
+        text = text.cast('B')
+
+    find = _first_byte_finder(text, pattern[0])
+    size = len(pattern)
+    n = len(text)
+    start = offset - size + 1
+
+    matches = []
+    i = 0
+
+    while i < n:
+        if j == 0:
+            i = find(i)
+
+            if i == -1:
+                break
+
+            j = 1
+        else:
+            ch = text[i]
+
+            while j > 0 and ch != pattern[j]:
+                j = pmt[j - 1]
+
+            if ch == pattern[j]:
+                j += 1
+            elif j == 0:
+                i += 1
+                continue
+
+        if j == size:
+            matches.append(start + i)
+            j = pmt[j - 1]
+
+        i += 1
+
+    return matches, j
+
+
+class KMPMatcher:
+    """A resumable KMP matcher for one pattern over a stream of chunks
+
+    The partial match table is computed once, and the length of the
+    currently matched pattern prefix is carried from one chunk to the next,
+    so matches spanning chunk boundaries are found and the text never has
+    to be held in memory. Offsets are absolute positions in the
+    concatenation of every chunk fed since the last reset.
+
+    A str pattern is matched against str chunks, a bytes pattern against
+    bytes-like chunks (bytes, bytearray, memoryview, mmap).
+
+        construction: O(m)
+        feeding n symbols: O(n), O(m) memory
+    """
+
+    def __init__(self, pattern):
+
+        if len(pattern) == 0:
+            raise ValueError("Pattern must not be empty!")
+
+        self._is_str = isinstance(pattern, str)
+        self._pattern = pattern if self._is_str else bytes(pattern)
+        self._pmt = partial_match_table(self._pattern)
+
+        self._matched = 0
+        self.offset = 0
+
+    def reset(self):
+
+        self._matched = 0
+        self.offset = 0
+
+    def feed(self, chunk):
+        """Consume chunk, return the offsets of the matches ending inside it"""
+
+        if self._is_str:
+            if not isinstance(chunk, str):
+                raise TypeError("Expect str chunks!")
+            scan = _kmp_scan
+        else:
+            if isinstance(chunk, str):
+                raise TypeError("Expect bytes-like chunks!")
+            if isinstance(chunk, memoryview):
+                chunk = chunk.cast('B')
+            scan = _kmp_scan_bytes
+
+        matches, self._matched = scan(chunk, self._pattern, self._pmt,
+                                      self._matched, self.offset)
+        self.offset += len(chunk)
+
+        return matches
+
+    def iter_matches(self, chunks):
+        """Lazily yield the match offsets over an iterable of chunks"""
+
+        for chunk in chunks:
+            yield from self.feed(chunk)
+
+    def iter_file(self, f, chunk_size=1 << 20):
+        """Lazily yield the match offsets in a file-like object, reading
+        chunk_size units at a time"""
+
+        while True:
+            chunk = f.read(chunk_size)
+
+            if not chunk:
+                return
+
+            yield from self.feed(chunk)
+
+
+if __name__ == "__main__":
+
+    text = "AABAACAADAABAABA"
+    pattern = "AABA"
+
+    print(kmp_match(text, pattern))
+
+    matcher = KMPMatcher(b"AABA")
+
+    print(list(matcher.iter_matches([b"AABAACAADAA", b"BAA", b"BA"])))
+
+    rng = random.Random(0)
+    size = 1 << 20
+
+    print("%d bytes of uniform text, seconds" % size)
+    print("%10s %10s %10s %10s" % ("alphabet", "pattern", "generic",
+                                   "bytes"))
+
+    for alphabet_size in [2, 4, 26, 256]:
+        text = bytes(rng.randrange(alphabet_size) for _ in range(size))
+
+        for pattern_size in [4, 16, 64]:
+            # a pattern that does occur, taken from the middle of the text
+            pos = rng.randrange(size - pattern_size)
+            pattern = text[pos:pos + pattern_size]
+            pmt = partial_match_table(pattern)
+
+            start = time.perf_counter()
+            expected = _kmp_match_generic(text, pattern, pmt)
+            generic = time.perf_counter() - start
+
+            start = time.perf_counter()
+            assert kmp_match(text, pattern) == expected
+            fast = time.perf_counter() - start
 
-print(kmp_match(text, pattern))
+            print("%10d %10d %10.4f %10.4f" %
+                  (alphabet_size, pattern_size, generic, fast))
@@ -1,103 +1,307 @@
-import math
+import operator
+
+import numpy as np
+
+
+class LazySegmentTree:
+    """A lazy propagation segment tree with range add / range assign updates
+    and range sum / min / max queries
+
+    The tree is stored in flat python lists with the leaves at
+    [capacity, 2 * capacity), capacity being n rounded up to a power of two.
+    The lists are built level by level with numpy and then converted once,
+    so the per-node work of updates and queries reads and writes plain
+    python numbers instead of boxing numpy scalars. Updates and queries are
+    iterative: the tags on the two boundary paths are pushed down first, the
+    O(log(n)) canonical nodes of the range are then visited bottom-up and
+    finally the boundary paths are recomputed.
+
+    Tags compose: an assign clears any pending add and a later add is folded
+    into a pending assign, so every internal node carries at most one assign
+    and one add. Negative deltas are handled like any other delta. Integer
+    values are python ints, so sums do not wrap around.
+
+    All ranges are closed, [l, r], like SegmentTree.query.
+
+        construction: O(n) time, O(n) space
+        range add / range assign: O(log(n))
+        range sum / min / max: O(log(n))
+    """
+
+    def __init__(self, arr, dtype=None):
+
+        values = np.asarray(arr, dtype=dtype)
+
+        if values.dtype.kind not in 'iuf':
+            values = values.astype(np.int64)
+
+        self._size = len(values)
+        self._log = max(self._size - 1, 0).bit_length()
+        self._capacity = 1 << self._log
+
+        dtype = values.dtype
+        capacity = self._capacity
+
+        if np.issubdtype(dtype, np.integer):
+            upper, lower = np.iinfo(dtype).max, np.iinfo(dtype).min
+        else:
+            upper, lower = np.inf, -np.inf
+
+        total = np.zeros(2 * capacity, dtype=dtype)
+        low = np.full(2 * capacity, upper, dtype=dtype)
+        high = np.full(2 * capacity, lower, dtype=dtype)
+
+        total[capacity:capacity + self._size] = values
+        low[capacity:capacity + self._size] = values
+        high[capacity:capacity + self._size] = values
+
+        for level in reversed(range(self._log)):
+            lo, hi = 1 << level, 2 << level
+            total[lo:hi] = total[2 * lo:2 * hi:2] + total[2 * lo + 1:2 * hi:2]
+            low[lo:hi] = np.minimum(low[2 * lo:2 * hi:2],
+                                    low[2 * lo + 1:2 * hi:2])
+            high[lo:hi] = np.maximum(high[2 * lo:2 * hi:2],
+                                     high[2 * lo + 1:2 * hi:2])
+
+        self._upper, self._lower = upper, lower
+
+        self._sum = total.tolist()
+        self._min = low.tolist()
+        self._max = high.tolist()
+
+        # tags only live on internal nodes, None meaning no pending assign
+        self._add = [dtype.type(0).item()] * capacity
+        self._assign = [None] * capacity
+
+    def _leaf_range(self, l, r):
+
+        if l < 0 or r >= self._size or l > r:
+            raise ValueError("Incorrect range!")
+
+        return l + self._capacity, r + self._capacity + 1
+
+    def _boundaries(self, l, r):
+        """The ancestors of the half open leaf range [l, r) that only
+        partially overlap it, from the root down"""
+
+        # l >> i needs a push for every level i above the lowest set bit of
+        # l, the same goes for r, and the levels from the highest differing
+        # bit of l and r - 1 up are ancestors of both
+        low_l = (l & -l).bit_length() - 1
+        low_r = (r & -r).bit_length() - 1
+        split = (l ^ (r - 1)).bit_length()
+        top = max(split, min(low_l, low_r) + 1)
+
+        return ([l >> i for i in range(self._log, top - 1, -1)] +
+                [l >> i for i in range(split - 1, low_l, -1)] +
+                [(r - 1) >> i for i in range(split - 1, low_r, -1)])
+
+    def _push(self, path):
+        """Move the pending tags of every node of path down to its
+        children, path being ordered from the root down"""
+
+        total, low, high = self._sum, self._min, self._max
+        add, assign = self._add, self._assign
+        capacity = self._capacity
+
+        for k in path:
+            val = assign[k]
+            delta = add[k]
+
+            if val is None and not delta:
+                continue
+
+            length = capacity >> k.bit_length()
+            left = 2 * k
+            right = left + 1
+
+            if val is not None:
+                total[left] = total[right] = val * length
+                low[left] = high[left] = low[right] = high[right] = val
+
+                if left < capacity:
+                    assign[left] = assign[right] = val
+                    add[left] = add[right] = 0
+
+                assign[k] = None
+
+            if delta:
+                total[left] += delta * length
+                total[right] += delta * length
+                low[left] += delta
+                low[right] += delta
+                high[left] += delta
+                high[right] += delta
+
+                if left < capacity:
+                    for child in (left, right):
+                        if assign[child] is not None:
+                            assign[child] += delta
+                        else:
+                            add[child] += delta
+
+                add[k] = 0
+
+    def _pull(self, path):
+        """Recompute every node of path from its children, deepest first"""
+
+        total, low, high = self._sum, self._min, self._max
+
+        for k in reversed(path):
+            left = 2 * k
+
+            total[k] = total[left] + total[left + 1]
+
+            a, b = low[left], low[left + 1]
+            low[k] = a if a < b else b
+
+            a, b = high[left], high[left + 1]
+            high[k] = a if a > b else b
+
+    @staticmethod
+    def _canonical(lo, hi):
+        """(node, length) of the O(log(n)) nodes covering the half open leaf
+        range [lo, hi)"""
+
+        nodes = []
+        length = 1
+
+        while lo < hi:
+            if lo & 1:
+                nodes.append((lo, length))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                nodes.append((hi, length))
+            lo >>= 1
+            hi >>= 1
+            length <<= 1
+
+        return nodes
+
+    def _query(self, l, r, values, combine, identity):
+
+        l, r = self._leaf_range(l, r)
+
+        self._push(self._boundaries(l, r))
+
+        ret = identity
+
+        while l < r:
+            if l & 1:
+                ret = combine(ret, values[l])
+                l += 1
+            if r & 1:
+                r -= 1
+                ret = combine(ret, values[r])
+            l >>= 1
+            r >>= 1
+
+        return ret
+
+    def range_add(self, l, r, val):
+
+        l, r = self._leaf_range(l, r)
+
+        path = self._boundaries(l, r)
+        self._push(path)
+
+        total, low, high = self._sum, self._min, self._max
+        add, assign = self._add, self._assign
+        capacity = self._capacity
+
+        for k, length in self._canonical(l, r):
+            total[k] += val * length
+            low[k] += val
+            high[k] += val
+
+            if k < capacity:
+                if assign[k] is not None:
+                    assign[k] += val
+                else:
+                    add[k] += val
+
+        self._pull(path)
+
+    def range_assign(self, l, r, val):
+
+        l, r = self._leaf_range(l, r)
+
+        path = self._boundaries(l, r)
+        self._push(path)
+
+        total, low, high = self._sum, self._min, self._max
+        add, assign = self._add, self._assign
+        capacity = self._capacity
+
+        for k, length in self._canonical(l, r):
+            total[k] = val * length
+            low[k] = high[k] = val
+
+            if k < capacity:
+                assign[k] = val
+                add[k] = 0
+
+        self._pull(path)
+
+    def range_sum(self, l, r):
+        return self._query(l, r, self._sum, operator.add, 0)
+
+    def range_min(self, l, r):
+        return self._query(l, r, self._min, min, self._upper)
+
+    def range_max(self, l, r):
+        return self._query(l, r, self._max, max, self._lower)
+
 
 class LazySegmentTreeForKBooking:
     """An implementation of a lazy segment tree for the following problem:
         `
             Implement a MyCalendarThree class to store your events. A new event can always be added.
 
-            Your class will have one method, book(int start, int end). Formally, this represents a 
-            booking on the half open interval [start, end), the range of real numbers x such that 
+            Your class will have one method, book(int start, int end). Formally, this represents a
+            booking on the half open interval [start, end), the range of real numbers x such that
             start <= x < end.
 
-            A K-booking happens when K events have some non-empty intersection (ie., there is some 
+            A K-booking happens when K events have some non-empty intersection (ie., there is some
             time that is common to all K events.)
 
-            For each call to the method MyCalendar.book, return an integer K representing the largest 
+            For each call to the method MyCalendar.book, return an integer K representing the largest
             integer such that there exists a K-booking in the calendar.
         `
+
+    Bookings are range adds of +1 on a LazySegmentTree, cancel undoes one
+    with a range add of -1.
     """
 
     def __init__(self, RANGE):
 
-        height = math.ceil(math.log2(RANGE))
-
-        self._tree_size = 2 * pow(2, height) - 1
         self._arr_size = RANGE
+        self._tree = LazySegmentTree(np.zeros(RANGE, dtype=np.int64))
 
-        self._arr = [0] * self._tree_size
-        self._laziness = [0] * self._tree_size
-    
-    def left(self, index):
-        return 2 * index + 1
+    def book(self, start, end):
 
-    def right(self, index):
-        return 2 * index + 2
+        self._tree.range_add(start, end - 1, 1)
+
+        return self._tree.range_max(0, self._arr_size - 1)
+
+    def cancel(self, start, end):
+
+        self._tree.range_add(start, end - 1, -1)
+
+        return self._tree.range_max(0, self._arr_size - 1)
 
-    def _query(self, root, ss, se, l, r):
-        self._normalize(root, ss, se)
-        if se < l or ss > r:
-            return 0
-        else:
-            if l <= ss <= se <= r:
-                return self._arr[root]
-            else:
-                mid = ss + (se - ss) // 2
-                left_child = self.left(root)
-                right_child = self.right(root)
-                left_val = self._query(left_child, ss, mid, l, r)
-                right_val = self._query(right_child, mid+1, se, l, r)
-                self._arr[root] = max(left_val, right_val)
-                return self._arr[root]
-    
-    def _update(self, root, ss, se, l, r, val):
-        self._normalize(root, ss, se)
-        if ss < l or ss > r:
-            return
-        else:
-            if l <= ss <= se <= r:
-                # this is the only branch where we are gaining by using laziness during range update
-                self._laziness[root] += val
-                # we do not directly set self._arr
-                # instead we let _normalize push down the changes
-                self._normalize(root, ss, se)
-            else:
-                mid = ss + (se - ss) // 2
-                left_child = self.left(root)
-                right_child = self.right(root)
-                self._update(left_child, ss, mid, l, r, val)
-                self._update(right_child, mid+1, se, l, r, val)
-                self._arr[root] = max(self._arr[left_child], self._arr[right_child])
-    
-    def _normalize(self, root, ss, se):
-        """Normalize the tree node by pushing down the laziness if possible
-
-        simply return if laziness is zero
-        otherwise, check if current node is leaf
-            if yes => update value and reset
-            if no  => update value, push down laziness and reset
-        """
-        if self._laziness[root] > 0:
-            self._arr[root] += self._laziness[root]
-            if ss != se:
-                left_child = self.left(root)
-                right_child = self.right(root)
-                self._laziness[left_child] += self._laziness[root]
-                self._laziness[right_child] += self._laziness[root]
-            self._laziness[root] = 0
-        
-    def book(self, start, end):
-        
-        self._update(0, 0, self._arr_size-1, start, end-1, 1)
 
-        return self._arr[0]
+if __name__ == "__main__":
 
-booking = LazySegmentTreeForKBooking(10)
+    booking = LazySegmentTreeForKBooking(10)
 
-print(booking.book(0, 1))
-print(booking.book(0, 2))
-print(booking.book(1, 2))
-print(booking.book(0, 2))
-print(booking.book(0, 4))
-print(booking.book(2, 4))
-print(booking.book(3, 4))
-print(booking.book(0, 10))
\ No newline at end of file
+    print(booking.book(0, 1))
+    print(booking.book(0, 2))
+    print(booking.book(1, 2))
+    print(booking.book(0, 2))
+    print(booking.book(0, 4))
+    print(booking.book(2, 4))
+    print(booking.book(3, 4))
+    print(booking.book(0, 10))
+    print(booking.cancel(0, 2))
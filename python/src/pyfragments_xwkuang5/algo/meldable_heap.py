@@ -0,0 +1,671 @@
+import random
+import time
+
+_FREE = object()
+
+
+class _Owner:
+    """Identifies a heap to the nodes it holds
+
+    meld can not relabel every node of the melded heap in O(1), so the owner
+    of that heap forwards to the owner of the heap it was melded into, and
+    the chains are shortened as they are followed.
+    """
+
+    __slots__ = ('forward', )
+
+    def __init__(self):
+        self.forward = None
+
+    def resolve(self):
+
+        owner = self
+
+        while owner.forward is not None:
+            if owner.forward.forward is not None:
+                owner.forward = owner.forward.forward
+            owner = owner.forward
+
+        return owner
+
+
+class NodePool:
+    """Parallel lists holding the nodes of one or several heaps
+
+    A node is an index into the lists and the handle of its entry. Freed
+    nodes are recycled by later inserts, so once warmed up a heap does not
+    allocate per operation, and no node object is ever created. Heaps built
+    on the same pool can be melded in O(1) with every handle staying valid,
+    which is why handles are unique per pool rather than per heap. Every
+    node also records the heap holding it, so a heap rejects the handles
+    of the other heaps on its pool.
+    """
+
+    def __init__(self, links):
+
+        self.prio = []
+        self.item = []
+        self.owner = []
+        self._links = [[] for _ in links]
+        self._free = []
+
+        for name, values in zip(links, self._links):
+            setattr(self, name, values)
+
+    def __contains__(self, node):
+        return 0 <= node < len(self.prio) and self.prio[node] is not _FREE
+
+    def alloc(self, priority, item, owner):
+        """Return a node of owner holding (item, priority), its links are
+        left for the caller to set"""
+
+        if self._free:
+            node = self._free.pop()
+            self.prio[node] = priority
+            self.item[node] = item
+            self.owner[node] = owner
+            return node
+
+        self.prio.append(priority)
+        self.item.append(item)
+        self.owner.append(owner)
+
+        for values in self._links:
+            values.append(-1)
+
+        return len(self.prio) - 1
+
+    def free(self, node):
+
+        ret = self.item[node], self.prio[node]
+
+        self.prio[node] = _FREE
+        self.item[node] = None
+        self.owner[node] = None
+        self._free.append(node)
+
+        return ret
+
+
+class _MeldableHeap:
+    """The handle API shared with priority_queue.PriorityQueue"""
+
+    _LINKS = ()
+
+    def __init__(self, priorities=(), items=None, pool=None):
+        """Insert the given priorities in order, entry i getting handle i
+        when the pool is new"""
+
+        if pool is None:
+            pool = NodePool(self._LINKS)
+        elif not all(hasattr(pool, name) for name in self._LINKS):
+            raise ValueError("Pool was created for another heap type!")
+
+        self._pool = pool
+        self._owner = _Owner()
+        self._root = -1
+        self._size = 0
+
+        priorities = list(priorities)
+        items = [None] * len(priorities) if items is None else list(items)
+
+        if len(items) != len(priorities):
+            raise ValueError("items and priorities must have the same length!")
+
+        for priority, item in zip(priorities, items):
+            self.insert(priority, item)
+
+    @property
+    def pool(self):
+        return self._pool
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, handle):
+
+        pool = self._pool
+
+        if handle not in pool:
+            return False
+
+        if pool.owner[handle].resolve() is not self._owner:
+            return False
+
+        # point the node straight to its heap for the next lookups
+        pool.owner[handle] = self._owner
+
+        return True
+
+    def is_empty(self):
+        return self._size == 0
+
+    def _check(self, handle):
+
+        if handle not in self:
+            raise KeyError(handle)
+
+        return handle
+
+    def priority(self, handle):
+        return self._pool.prio[self._check(handle)]
+
+    def item(self, handle):
+        return self._pool.item[self._check(handle)]
+
+    def peek(self):
+        """Return (item, priority) of the minimum entry"""
+
+        if self.is_empty():
+            raise IndexError("Can not peek into an empty queue")
+
+        return self._pool.item[self._root], self._pool.prio[self._root]
+
+    def peek_handle(self):
+
+        if self.is_empty():
+            raise IndexError("Can not peek into an empty queue")
+
+        return self._root
+
+    def pop(self):
+        """Remove the minimum entry, return its (item, priority)"""
+
+        if self.is_empty():
+            raise IndexError("Can not pop element from empty queue")
+
+        root = self._root
+
+        self._detach(root)
+        self._size -= 1
+
+        return self._pool.free(root)
+
+    def remove(self, handle):
+        """Remove the entry of handle, return its (item, priority)"""
+
+        self._detach(self._check(handle))
+        self._size -= 1
+
+        return self._pool.free(handle)
+
+    def update(self, handle, priority):
+        """Set the priority of handle, in either direction"""
+
+        if priority < self.priority(handle):
+            self.decrease_key(handle, priority)
+        else:
+            self.increase_key(handle, priority)
+
+    def _check_meld(self, other):
+
+        if other._pool is not self._pool:
+            raise ValueError("Only heaps sharing a pool can be melded!")
+
+        if other is self:
+            raise ValueError("Can not meld a heap with itself!")
+
+    def _adopt(self, other):
+        """Take over the entries of other once its root was melded in"""
+
+        self._size += other._size
+        other._root = -1
+        other._size = 0
+
+        # the nodes of other now belong to this heap, other starts afresh
+        other._owner.forward = self._owner
+        other._owner = _Owner()
+
+
+class PairingHeap(_MeldableHeap):
+    """A min pairing heap over a NodePool
+
+    The heap is a multiway tree stored as first child / next sibling links,
+    left pointing to the previous sibling, or to the parent for a first
+    child. Insert, meld and decrease_key link one tree under the root, and
+    pop merges the children of the root pairwise left to right, then the
+    pairs right to left.
+
+        insert, meld, peek: O(1)
+        decrease_key: O(1) in practice, o(log(n)) amortized
+        pop, remove, increase_key: O(log(n)) amortized
+    """
+
+    _LINKS = ('child', 'left', 'right')
+
+    def _link(self, a, b):
+        """Link two roots, return the root of the result"""
+
+        pool = self._pool
+        prio = pool.prio
+
+        if prio[b] < prio[a]:
+            a, b = b, a
+
+        child, left, right = pool.child, pool.left, pool.right
+
+        first = child[a]
+        right[b] = first
+        if first != -1:
+            left[first] = b
+        left[b] = a
+        child[a] = b
+
+        return a
+
+    def _cut(self, node):
+        """Detach the subtree of a non-root node"""
+
+        pool = self._pool
+        child, left, right = pool.child, pool.left, pool.right
+
+        prev, nxt = left[node], right[node]
+
+        if child[prev] == node:
+            child[prev] = nxt
+        else:
+            right[prev] = nxt
+
+        if nxt != -1:
+            left[nxt] = prev
+
+        left[node] = right[node] = -1
+
+    def _combine(self, first):
+        """Two-pass pairing of the sibling list starting at first"""
+
+        if first == -1:
+            return -1
+
+        left, right = self._pool.left, self._pool.right
+
+        trees = []
+        node = first
+
+        while node != -1:
+            a = node
+            b = right[a]
+            node = right[b] if b != -1 else -1
+
+            left[a] = right[a] = -1
+
+            if b != -1:
+                left[b] = right[b] = -1
+                a = self._link(a, b)
+
+            trees.append(a)
+
+        root = trees.pop()
+
+        while trees:
+            root = self._link(trees.pop(), root)
+
+        return root
+
+    def _detach(self, node):
+        """Take node out of the heap, its children staying in"""
+
+        child = self._pool.child
+
+        if node == self._root:
+            self._root = self._combine(child[node])
+        else:
+            self._cut(node)
+            subtree = self._combine(child[node])
+            if subtree != -1:
+                self._root = self._link(self._root, subtree)
+
+        child[node] = -1
+
+    def insert(self, priority, item=None):
+        """Add an entry, return its handle"""
+
+        pool = self._pool
+        node = pool.alloc(priority, item, self._owner)
+        pool.child[node] = pool.left[node] = pool.right[node] = -1
+
+        self._root = node if self._root == -1 else self._link(self._root, node)
+        self._size += 1
+
+        return node
+
+    def decrease_key(self, handle, priority):
+
+        if priority > self.priority(handle):
+            raise ValueError("New priority is greater than the current one!")
+
+        self._pool.prio[handle] = priority
+
+        if handle != self._root:
+            self._cut(handle)
+            self._root = self._link(self._root, handle)
+
+    def increase_key(self, handle, priority):
+
+        if priority < self.priority(handle):
+            raise ValueError("New priority is smaller than the current one!")
+
+        self._detach(handle)
+        self._pool.prio[handle] = priority
+
+        self._root = (handle if self._root == -1 else self._link(
+            self._root, handle))
+
+    def meld(self, other):
+        """Move every entry of other, built on the same pool, into this
+        heap in O(1), leaving other empty"""
+
+        self._check_meld(other)
+
+        if other._root != -1:
+            self._root = (other._root if self._root == -1 else self._link(
+                self._root, other._root))
+
+        self._adopt(other)
+
+
+class FibonacciHeap(_MeldableHeap):
+    """A min Fibonacci heap over a NodePool
+
+    The roots, and the children of every node, form circular doubly linked
+    lists through left / right. Insert and meld only splice lists, pop
+    consolidates the roots so no two have the same degree, and
+    decrease_key cuts the node to the root list, cascading up through the
+    marked ancestors that already lost a child.
+
+        insert, meld, peek, decrease_key: O(1) amortized
+        pop, remove, increase_key: O(log(n)) amortized
+
+    The constant factors are larger than those of PairingHeap, which is
+    usually faster in practice.
+    """
+
+    _LINKS = ('parent', 'child', 'left', 'right', 'degree', 'mark')
+
+    def _splice(self, a, b):
+        """Concatenate the circular lists containing a and b"""
+
+        left, right = self._pool.left, self._pool.right
+
+        a_next, b_prev = right[a], left[b]
+
+        right[a] = b
+        left[b] = a
+        right[b_prev] = a_next
+        left[a_next] = b_prev
+
+    def _unlink(self, node):
+        """Take node out of its circular list"""
+
+        left, right = self._pool.left, self._pool.right
+
+        right[left[node]] = right[node]
+        left[right[node]] = left[node]
+        left[node] = right[node] = node
+
+    def _add_root(self, node):
+
+        pool = self._pool
+
+        pool.parent[node] = -1
+        pool.mark[node] = False
+
+        if self._root == -1:
+            self._root = node
+        else:
+            self._splice(self._root, node)
+
+            if pool.prio[node] < pool.prio[self._root]:
+                self._root = node
+
+    def _cut(self, node, parent):
+        """Move node from the children of parent to the root list"""
+
+        pool = self._pool
+
+        if pool.right[node] == node:
+            pool.child[parent] = -1
+        else:
+            if pool.child[parent] == node:
+                pool.child[parent] = pool.right[node]
+            self._unlink(node)
+
+        pool.degree[parent] -= 1
+        self._add_root(node)
+
+    def _cascading_cut(self, node):
+
+        pool = self._pool
+        parent = pool.parent[node]
+
+        while parent != -1:
+            if not pool.mark[node]:
+                pool.mark[node] = True
+                return
+
+            self._cut(node, parent)
+            node, parent = parent, pool.parent[parent]
+
+    def _link(self, node, root):
+        """Make the root node a child of root"""
+
+        pool = self._pool
+
+        self._unlink(node)
+
+        first = pool.child[root]
+        if first == -1:
+            pool.child[root] = node
+        else:
+            self._splice(first, node)
+
+        pool.parent[node] = root
+        pool.degree[root] += 1
+        pool.mark[node] = False
+
+    def _consolidate(self, start):
+
+        pool = self._pool
+        prio, degree, right = pool.prio, pool.degree, pool.right
+
+        roots = [start]
+        node = right[start]
+        while node != start:
+            roots.append(node)
+            node = right[node]
+
+        table = []
+
+        for node in roots:
+            d = degree[node]
+
+            while d < len(table) and table[d] != -1:
+                other = table[d]
+
+                if prio[other] < prio[node]:
+                    node, other = other, node
+
+                self._link(other, node)
+                table[d] = -1
+                d += 1
+
+            if d >= len(table):
+                table.extend([-1] * (d + 1 - len(table)))
+
+            table[d] = node
+
+        self._root = -1
+
+        for node in table:
+            if node != -1 and (self._root == -1 or
+                               prio[node] < prio[self._root]):
+                self._root = node
+
+    def _detach(self, node):
+        """Take node out of the heap, its children becoming roots"""
+
+        pool = self._pool
+
+        parent = pool.parent[node]
+
+        if parent != -1:
+            self._cut(node, parent)
+            self._cascading_cut(parent)
+
+        # node is now a root, its children join the root list
+        first = pool.child[node]
+
+        if first != -1:
+            child = first
+            while True:
+                pool.parent[child] = -1
+                pool.mark[child] = False
+                child = pool.right[child]
+                if child == first:
+                    break
+
+            self._splice(node, first)
+            pool.child[node] = -1
+            pool.degree[node] = 0
+
+        if pool.right[node] == node:
+            self._root = -1
+        else:
+            start = pool.right[node]
+            self._unlink(node)
+            self._consolidate(start)
+
+    def insert(self, priority, item=None):
+        """Add an entry, return its handle"""
+
+        pool = self._pool
+        node = pool.alloc(priority, item, self._owner)
+
+        pool.child[node] = -1
+        pool.left[node] = pool.right[node] = node
+        pool.degree[node] = 0
+
+        self._add_root(node)
+        self._size += 1
+
+        return node
+
+    def decrease_key(self, handle, priority):
+
+        if priority > self.priority(handle):
+            raise ValueError("New priority is greater than the current one!")
+
+        pool = self._pool
+        pool.prio[handle] = priority
+
+        parent = pool.parent[handle]
+
+        if parent != -1 and priority < pool.prio[parent]:
+            self._cut(handle, parent)
+            self._cascading_cut(parent)
+
+        if priority < pool.prio[self._root]:
+            self._root = handle
+
+    def increase_key(self, handle, priority):
+
+        if priority < self.priority(handle):
+            raise ValueError("New priority is smaller than the current one!")
+
+        self._detach(handle)
+        self._pool.prio[handle] = priority
+        self._add_root(handle)
+
+    def meld(self, other):
+        """Move every entry of other, built on the same pool, into this
+        heap in O(1), leaving other empty"""
+
+        self._check_meld(other)
+
+        if other._root != -1:
+            if self._root == -1:
+                self._root = other._root
+            else:
+                self._splice(self._root, other._root)
+
+                if self._pool.prio[other._root] < self._pool.prio[self._root]:
+                    self._root = other._root
+
+        self._adopt(other)
+
+
+if __name__ == "__main__":
+
+    from functools import partial
+
+    from pyfragments_xwkuang5.algo.priority_queue import PriorityQueue
+
+    n = 1 << 16
+    rng = random.Random(0)
+    priorities = [rng.random() for _ in range(n)]
+
+    def insert_pop(heap_type):
+
+        heap = heap_type()
+        for priority in priorities:
+            heap.insert(priority)
+        while not heap.is_empty():
+            heap.pop()
+
+    def decrease_heavy(heap_type):
+        """Dijkstra-like: every entry is decreased four times on average"""
+
+        heap = heap_type()
+        handles = [heap.insert(priority) for priority in priorities]
+        for _ in range(4 * n):
+            handle = rng.choice(handles)
+            heap.decrease_key(handle, heap.priority(handle) * 0.9)
+        while not heap.is_empty():
+            heap.pop()
+
+    def meld_heavy(heap_type, shards=256):
+        """Merge per-shard queues pairwise, then drain"""
+
+        size = n // shards
+
+        if not hasattr(heap_type, 'meld'):
+            # no meld, drain every shard into the first one
+            heaps = [
+                heap_type(priorities[i:i + size]) for i in range(0, n, size)
+            ]
+            merged = heaps[0]
+            for heap in heaps[1:]:
+                while not heap.is_empty():
+                    merged.insert(heap.pop()[1])
+        else:
+            pool = NodePool(heap_type._LINKS)
+            heaps = [
+                heap_type(priorities[i:i + size], pool=pool)
+                for i in range(0, n, size)
+            ]
+            merged = heaps[0]
+            for heap in heaps[1:]:
+                merged.meld(heap)
+
+        while not merged.is_empty():
+            merged.pop()
+
+    heap_types = [
+        ("PriorityQueue(2)", partial(PriorityQueue, arity=2)),
+        ("PriorityQueue(4)", PriorityQueue),
+        ("PairingHeap", PairingHeap),
+        ("FibonacciHeap", FibonacciHeap),
+    ]
+
+    print("%d entries, seconds" % n)
+    print("%20s %12s %12s %12s" % ("", "insert/pop", "decrease", "meld"))
+
+    for name, heap_type in heap_types:
+        timings = []
+
+        for workload in [insert_pop, decrease_heavy, meld_heavy]:
+            start = time.perf_counter()
+            workload(heap_type)
+            timings.append(time.perf_counter() - start)
+
+        print("%20s %12.4f %12.4f %12.4f" % ((name, ) + tuple(timings)))
@@ -0,0 +1,257 @@
+import math
+import operator
+
+import numpy as np
+
+
+class Monoid:
+    """An associative binary operator together with its identity element
+
+    combine     : python callable used when combining two single elements
+    identity    : identity element, or a callable taking a numpy dtype and
+                  returning the identity for that dtype (e.g. +inf for min)
+    ufunc       : optional vectorized combine over numpy arrays. Monoids
+                  without one are stored in object arrays and vectorized
+                  with np.frompyfunc(combine), so every data structure can
+                  run through the same array code path
+    lift        : optional callable lift(values, idxs) mapping raw input
+                  values at positions idxs to the stored elements, e.g. a
+                  value v at i becomes (v, i) for argmin
+    accumulates : True if combining integers can leave the range of their
+                  dtype, as with sums, so stores must check the bound of
+                  their aggregates instead of letting numpy wrap around
+
+    Combine does not need to be commutative, callers must keep the left to
+    right order of the operands.
+    """
+
+    def __init__(self,
+                 combine,
+                 identity,
+                 ufunc=None,
+                 lift=None,
+                 accumulates=False):
+
+        self.combine = combine
+        self.vectorized = ufunc is not None
+        self.ufunc = ufunc if ufunc is not None else np.frompyfunc(
+            combine, 2, 1)
+        self.lift = lift
+        self.accumulates = accumulates
+        self._identity = identity
+
+    def identity(self, dtype=None):
+
+        if callable(self._identity):
+            return self._identity(np.dtype(dtype))
+
+        return self._identity
+
+    def elements(self, values, dtype=None):
+        """Convert raw input values to a numpy array of stored elements"""
+
+        if self.lift is not None:
+            values = self.lift(values, np.arange(len(values)))
+
+        if self.vectorized:
+            return as_array(values, dtype=dtype)
+
+        return object_array(values)
+
+    def full(self, shape, dtype):
+        """An array of the given shape filled with the identity element"""
+
+        if not self.vectorized:
+            ret = np.empty(shape, dtype=object)
+            ret.fill(self.identity())
+            return ret
+
+        identity = self.identity(dtype)
+
+        return np.full(shape + np.shape(identity), identity, dtype=dtype)
+
+    @staticmethod
+    def product(*monoids):
+        """Combine several vectorized monoids into one that aggregates rows
+
+        Each element is a row with one column per monoid, so a single tree
+        can answer, e.g., sum, min and max of a range at once.
+        """
+
+        if not all(monoid.vectorized for monoid in monoids):
+            raise ValueError("Product monoids need vectorized components!")
+
+        ufuncs = [monoid.ufunc for monoid in monoids]
+
+        def combine(a, b):
+            return np.stack(
+                [ufunc(a[..., i], b[..., i]) for i, ufunc in enumerate(ufuncs)],
+                axis=-1)
+
+        def identity(dtype):
+            return np.array([monoid.identity(dtype) for monoid in monoids],
+                            dtype=dtype)
+
+        def lift(values, idxs):
+            values = np.asarray(values)
+
+            if values.ndim == 2:
+                return values
+
+            return np.stack([values] * len(monoids), axis=-1)
+
+        return Monoid(combine,
+                      identity,
+                      ufunc=combine,
+                      lift=lift,
+                      accumulates=any(monoid.accumulates
+                                      for monoid in monoids))
+
+
+def object_array(items):
+    """A 1-d object array whose elements are exactly the given items
+
+    np.asarray would turn a list of tuples into a 2-d array instead.
+    """
+
+    ret = np.empty(len(items), dtype=object)
+
+    for i, item in enumerate(items):
+        ret[i] = item
+
+    return ret
+
+
+def as_array(values, dtype=None):
+    """np.asarray that keeps python ints exact
+
+    np.asarray turns a list of ints beyond the int64 range into float64, it
+    becomes an object array of the ints instead.
+    """
+
+    ret = np.asarray(values, dtype=dtype)
+
+    if (dtype is None and ret.dtype.kind == 'f' and ret.ndim == 1 and
+            not isinstance(values, np.ndarray) and
+            all(isinstance(value, int) for value in values)):
+        return object_array(list(values))
+
+    return ret
+
+
+def fit_dtype(monoid, dtype, values, max_abs, size):
+    """The dtype to store values in an array of the given dtype
+
+    Integers stay integers as long as they fit the dtype, and for
+    accumulating monoids as long as the aggregate of up to size elements
+    does, max_abs being the largest magnitude stored so far. Otherwise they
+    go to int64 and then to python ints (object dtype), never to float and
+    never wrapped around.
+
+    Return the dtype and the new max_abs.
+    """
+
+    if dtype.kind not in 'biu':
+        return np.result_type(dtype, values), max_abs
+
+    if isinstance(values, int):
+        # the common case of a scalar below the magnitudes seen so far
+        if (values >= 0 or dtype.kind == 'i') and abs(values) < max_abs:
+            return dtype, max_abs
+
+        lo = hi = values
+    else:
+        values = np.asarray(values)
+
+        if values.dtype.kind not in 'biu':
+            return np.result_type(dtype, values), max_abs
+
+        lo = int(values.min()) if values.size else 0
+        hi = int(values.max()) if values.size else 0
+
+    fit = np.result_type(dtype, values)
+
+    if fit.kind not in 'biu':
+        # int64 and uint64 mix into float64
+        fit = dtype
+
+    max_abs = max(max_abs, hi, -lo)
+
+    if monoid.accumulates:
+        if fit.kind == 'b':
+            fit = np.dtype(np.int64)
+
+        hi = max_abs * size
+        lo = -hi if fit.kind == 'i' else lo
+
+    for candidate in [fit, np.dtype(np.int64)]:
+        if candidate.kind == 'b' or (np.iinfo(candidate).min <= lo and
+                                     hi <= np.iinfo(candidate).max):
+            return candidate, max_abs
+
+    return np.dtype(object), max_abs
+
+
+def _max_of(dtype):
+    if np.issubdtype(dtype, np.integer):
+        return np.iinfo(dtype).max
+    return dtype.type(np.inf)
+
+
+def _min_of(dtype):
+    if np.issubdtype(dtype, np.integer):
+        return np.iinfo(dtype).min
+    return dtype.type(-np.inf)
+
+
+def _zero(dtype):
+    return dtype.type(0)
+
+
+def _argmin_lift(values, idxs):
+    return object_array(list(zip(np.asarray(values).tolist(), idxs.tolist())))
+
+
+def _count_sum_lift(values, idxs):
+    values = np.asarray(values)
+
+    if values.ndim == 2:
+        return values
+
+    return np.stack([np.ones_like(values), values], axis=-1)
+
+
+SUM = Monoid(operator.add, _zero, ufunc=np.add, accumulates=True)
+MIN = Monoid(min, _max_of, ufunc=np.minimum)
+MAX = Monoid(max, _min_of, ufunc=np.maximum)
+GCD = Monoid(math.gcd, _zero, ufunc=np.gcd)
+XOR = Monoid(operator.xor, _zero, ufunc=np.bitwise_xor)
+
+# (value, index) pairs, ties go to the smaller index
+ARGMIN = Monoid(min, (math.inf, -1), lift=_argmin_lift)
+
+# (count, sum) rows
+COUNT_SUM = Monoid.product(SUM, SUM)
+COUNT_SUM.lift = _count_sum_lift
+
+MONOIDS = {
+    'sum': SUM,
+    'min': MIN,
+    'max': MAX,
+    'gcd': GCD,
+    'xor': XOR,
+    'argmin': ARGMIN,
+    'count_sum': COUNT_SUM,
+}
+
+
+def get_monoid(monoid):
+    """Resolve a monoid name such as 'sum' to a Monoid, pass Monoids through"""
+
+    if isinstance(monoid, Monoid):
+        return monoid
+
+    if monoid not in MONOIDS:
+        raise ValueError("Invalid tree type!")
+
+    return MONOIDS[monoid]
@@ -1,41 +1,147 @@
 import heapq
+from array import array
+
 import numpy as np
 
 
 class disjoint_set:
     """A data structure for checking whether two elements belong to the same set
+
+    Parents are stored in an array.array of int32, or int64 when size does
+    not fit, so single element operations work on plain python ints, and
+    the bulk operations go through a zero-copy numpy view of the same
+    array. Every element starts in its own set.
+
+    find_set is iterative with path halving, every visited node being
+    pointed to its grandparent, and union_set links by rank, so both take
+    amortized O(alpha(n)) time. union_many links roots to the smaller root
+    a whole batch of pairs at a time, with a few numpy passes per round
+    until every pair is merged. It ignores ranks, which only keeps them
+    approximate.
     """
 
     def __init__(self, size):
-        self.parray = np.zeros(size, dtype=np.uint8)
-        self.rank = np.zeros(size, dtype=np.uint8)
+
+        dtype = np.dtype(np.int32 if size <= np.iinfo(np.int32).max else
+                         np.int64)
+
+        self.parray = array(dtype.char,
+                            np.arange(size, dtype=dtype).tobytes())
+        self.rank = bytearray(size)
+
+        self._view = np.frombuffer(self.parray, dtype=dtype)
+
+    def __len__(self):
+        return len(self.parray)
 
     def make_set(self, v):
         self.parray[v] = v
+        self.rank[v] = 0
 
     def find_set(self, v):
-        if self.parray[v] == v:
-            return v
-        else:
-            # With path compression
-            ret = self.find_set(self.parray[v])
-            self.parray[v] = ret
-            return ret
+
+        parray = self.parray
+
+        while parray[v] != v:
+            # With path halving
+            parray[v] = parray[parray[v]]
+            v = parray[v]
+
+        return v
 
     def union_set(self, i, j):
+        """Merge the sets of i and j, return whether they were distinct"""
+
         # With union by rank
         pi = self.find_set(i)
         pj = self.find_set(j)
+
+        if pi == pj:
+            return False
+
         ri = self.rank[pi]
         rj = self.rank[pj]
-        if pi != pj:
-            if ri < rj:
-                self.parray[pi] = pj
-            elif ri > rj:
-                self.parray[pj] = pi
-            else:
-                self.parray[pi] = pj
-                self.rank[pj] += 1
+
+        if ri < rj:
+            self.parray[pi] = pj
+        elif ri > rj:
+            self.parray[pj] = pi
+        else:
+            self.parray[pi] = pj
+            self.rank[pj] += 1
+
+        return True
+
+    def find_many(self, xs):
+        """The root of every element of xs as a numpy array, pointing the
+        elements straight to their roots"""
+
+        parray = self._view
+
+        xs = np.asarray(xs, dtype=parray.dtype)
+        roots = parray[xs]
+
+        active = np.flatnonzero(parray[roots] != roots)
+
+        while len(active) != 0:
+            # one path halving step for every element not at its root yet
+            grandparents = parray[parray[roots[active]]]
+            parray[roots[active]] = grandparents
+            roots[active] = grandparents
+
+            active = active[parray[grandparents] != grandparents]
+
+        parray[xs] = roots
+
+        return roots
+
+    def union_many(self, us, vs):
+        """Merge the sets of us[i] and vs[i] for every i
+
+        Every round links the larger root of each pair still in different
+        sets to the smallest root it is paired with, and the pairs left over
+        are retried from their roots in the next round. Links always point
+        to a smaller root, so no cycle can form.
+        """
+
+        parray = self._view
+
+        us = np.asarray(us, dtype=parray.dtype)
+        vs = np.asarray(vs, dtype=parray.dtype)
+
+        if us.shape != vs.shape:
+            raise ValueError("us and vs must have the same length!")
+
+        while len(us) != 0:
+            roots_u, roots_v = self.find_many(us), self.find_many(vs)
+            distinct = roots_u != roots_v
+
+            us = np.minimum(roots_u[distinct], roots_v[distinct])
+            vs = np.maximum(roots_u[distinct], roots_v[distinct])
+
+            # a plain parray[vs] = us keeps one arbitrary link per root, so a
+            # hub paired with k roots would take k rounds. Linking every root
+            # to its smallest partner merges a star in two rounds.
+            np.minimum.at(parray, vs, us)
+
+    def connected_components(self):
+        """Label every element with the number of its set, sets being
+        numbered 0..k-1 in the order of their roots"""
+
+        parray = self._view
+
+        # point every element to its root, doubling the jump each pass
+        while True:
+            grandparents = parray[parray]
+
+            if np.array_equal(grandparents, parray):
+                break
+
+            parray[:] = grandparents
+
+        is_root = parray == np.arange(len(parray))
+
+        return (np.cumsum(is_root) - 1)[parray]
 
 
 class Graph:
@@ -49,27 +155,26 @@ class Graph:
     def build_mst_kruskals(self):
         union_find_ds = disjoint_set(self.num_nodes)
         queue_copy = self.queue.copy()
-        for i in range(self.num_nodes):
-            union_find_ds.make_set(i)
 
         mst_cost = 0
 
         while len(queue_copy) != 0:
             (v, (i, j)) = heapq.heappop(queue_copy)
-            if union_find_ds.find_set(i) != union_find_ds.find_set(j):
-                union_find_ds.union_set(i, j)
+            if union_find_ds.union_set(i, j):
                 mst_cost += v
                 print("add edge (%d, %d) to MST" % (i, j))
 
         return mst_cost
 
 
-g = Graph(5)
-g.add_edge(0, 1, 2)
-g.add_edge(0, 2, 2)
-g.add_edge(1, 2, 3)
-g.add_edge(0, 3, 4)
-g.add_edge(1, 3, 2)
-g.add_edge(1, 4, 3)
-g.add_edge(0, 4, 1)
-print("cost of mst: %d" % g.build_mst_kruskals())
+if __name__ == "__main__":
+
+    g = Graph(5)
+    g.add_edge(0, 1, 2)
+    g.add_edge(0, 2, 2)
+    g.add_edge(1, 2, 3)
+    g.add_edge(0, 3, 4)
+    g.add_edge(1, 3, 2)
+    g.add_edge(1, 4, 3)
+    g.add_edge(0, 4, 1)
+    print("cost of mst: %d" % g.build_mst_kruskals())
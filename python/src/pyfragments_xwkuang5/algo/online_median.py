@@ -1,176 +1,357 @@
-import copy
-import matplotlib
-matplotlib.use('agg')
-import matplotlib.pyplot as plt
+import math
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from itertools import accumulate
 
+import numpy as np
 
-class Heap:
-    def __init__(self, list_, min_heap=True):
+from pyfragments_xwkuang5.algo.heap import Heap
 
-        self._size = len(list_)
-        self._arr = list_[:]
-        self._min_heap = min_heap
 
-        self._build_heap()
+class OnlineMedian:
+    def __init__(self):
+
+        self._max_heap = Heap([], min_heap=False)
+        self._min_heap = Heap([], min_heap=True)
+
+    def find_median(self, val):
+        """This algorithm implements the O(log(n)) method for finding median
+        of a sequence in an online fashion. The algorithm maintains two heap
+        for bookeeping. A max_heap to store the smaller half of the sequence
+        and a min_heap to store the greater half of the sequence. Median is
+        defined as a_ceiling(n/2). Note that the algorithm only needs to be
+        tweaked a little bit to work for the general definition of median.
+        """
+
+        if len(self._max_heap) == 0 and len(self._min_heap) == 0:
+            self._max_heap.push(val)
+            return val
+
+        elif len(self._max_heap) != 0 and len(self._min_heap) == 0:
+            cur_median = self._max_heap.peek()
+
+            if cur_median <= val:
+                self._min_heap.push(val)
+                return cur_median
+            else:
+                self._min_heap.push(cur_median)
+                self._max_heap.replace(val)
+                return val
+        else:
+            max_heap_top = self._max_heap.peek()
+            min_heap_top = self._min_heap.peek()
+
+            if val <= max_heap_top:
+                if len(self._max_heap) == len(self._min_heap):
+                    self._max_heap.push(val)
+                    return max_heap_top
+                else:
+                    self._min_heap.push(max_heap_top)
+                    self._max_heap.replace(val)
+                    return self._max_heap.peek()
+            elif max_heap_top < val < min_heap_top:
+                if len(self._max_heap) == len(self._min_heap):
+                    self._max_heap.push(val)
+                    return val
+                else:
+                    self._min_heap.push(val)
+                    return max_heap_top
+            else:
+                if len(self._max_heap) == len(self._min_heap):
+                    self._max_heap.push(min_heap_top)
+                    self._min_heap.replace(val)
+                    return min_heap_top
+                else:
+                    self._min_heap.push(val)
+                    return max_heap_top
 
-    @property
-    def size(self):
+
+class _SortedBlocks:
+    """A sorted multiset stored as a list of sorted blocks
+
+    Insertion and deletion bisect the block maxima, then insort or delete
+    inside one block of at most 2 * load values, both in C, so they cost
+    O(log(n) + load) with a tiny constant. The position of every block is
+    only needed by kth and is recomputed lazily after a change.
+    """
+
+    def __init__(self, load=512):
+
+        self._load = load
+        self._blocks = []
+        self._maxes = []
+        self._offsets = None
+        self._size = 0
+
+    def __len__(self):
         return self._size
 
-    def get_top(self):
-        assert self._size >= 1, "[get_min]: size of heap can not be smaller than 1"
+    def rebuild(self, sorted_values):
+
+        load = self._load
+
+        self._blocks = [
+            sorted_values[i:i + load]
+            for i in range(0, len(sorted_values), load)
+        ]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._offsets = None
+        self._size = len(sorted_values)
 
-        return self._arr[0]
+    def add(self, value):
 
-    def pop_top(self):
+        self._offsets = None
+        self._size += 1
+
+        if not self._blocks:
+            self._blocks.append([value])
+            self._maxes.append(value)
+            return
+
+        i = bisect_left(self._maxes, value)
+
+        if i == len(self._blocks):
+            i -= 1
+            self._maxes[i] = value
+
+        block = self._blocks[i]
+        insort(block, value)
+
+        if len(block) > 2 * self._load:
+            self._blocks.insert(i + 1, block[self._load:])
+            del block[self._load:]
+            self._maxes.insert(i, block[-1])
+
+    def remove(self, value):
+        """Remove one copy of value, which must be present"""
 
-        ret = self._arr[0]
+        i = bisect_left(self._maxes, value)
+        block = self._blocks[i]
 
-        self._arr[0], self._arr[self._size - 1] = self._arr[self._size
-                                                            - 1], self._arr[0]
+        del block[bisect_left(block, value)]
 
+        self._offsets = None
         self._size -= 1
 
-        self._bubble_down(0)
+        if not block:
+            del self._blocks[i]
+            del self._maxes[i]
+        else:
+            self._maxes[i] = block[-1]
 
-        self._arr.pop(-1)
+    def kth(self, k):
+        """The k-th smallest value, 0-based"""
 
-        return ret
+        if self._offsets is None:
+            self._offsets = list(accumulate(len(block)
+                                            for block in self._blocks))
 
-    def insert(self, key):
-        self._arr.append(key)
-        self._size += 1
+        i = bisect_right(self._offsets, k)
+        start = self._offsets[i - 1] if i > 0 else 0
 
-        self._bubble_up(self._size - 1)
+        return self._blocks[i][k - start]
 
-    def _build_heap(self):
 
-        for i in reversed(range(self._first_leaf())):
-            self._bubble_down(i)
+class SlidingWindowQuantile:
+    """Median and arbitrary quantiles over the most recent samples
 
-    def _parent(i):
-        return (i - 1) // 2
+    The window is either the last `window` samples or, with `duration`,
+    the samples whose timestamp is within duration of the latest one
+    (timestamps must not decrease). Samples are kept in arrival order to
+    know what to evict, and in a sorted block list to answer order
+    statistics.
 
-    def _left(i):
-        return i * 2 + 1
+    quantile(q) is the nearest-rank quantile, the ceil(q * n)-th smallest
+    value, so quantile(0.5) is the median as defined by OnlineMedian.
 
-    def _right(i):
-        return (i + 1) * 2
+    extend ingests numpy batches: when a batch is large next to the window
+    it is cheaper to sort the new window in numpy than to insert and evict
+    one sample at a time, otherwise the samples go through add.
 
-    def _first_leaf(self):
-        return self._size // 2
+        add, evict: O(log(n) + load) amortized
+        quantile: O(n / load) after a change, O(log(n)) otherwise
+        extend of m samples: O(min(m * (log(n) + load), n * log(n)))
+    """
 
-    def _bubble_down(self, i):
+    # rebuild when m * REBUILD_FACTOR >= n, from measuring add against sort
+    _REBUILD_FACTOR = 16
 
-        if i < self._first_leaf():
+    def __init__(self, window=None, duration=None, load=512):
 
-            left = Heap._left(i)
-            right = Heap._right(i)
+        if (window is None) == (duration is None):
+            raise ValueError("Exactly one of window and duration is needed!")
 
-            swap_idx = i
+        if (window if window is not None else duration) <= 0:
+            raise ValueError("The window must not be empty!")
 
-            if self._min_heap:
-                if left < self._size and self._arr[swap_idx] > self._arr[left]:
-                    swap_idx = left
+        self._window = window
+        self._duration = duration
 
-                if right < self._size and self._arr[swap_idx] > self._arr[right]:
-                    swap_idx = right
-            else:
-                if left < self._size and self._arr[swap_idx] < self._arr[left]:
-                    swap_idx = left
-                if right < self._size and self._arr[swap_idx] < self._arr[right]:
-                    swap_idx = right
+        self._values = deque()
+        self._timestamps = deque() if duration is not None else None
+        self._latest = None
 
-            if swap_idx != i:
+        self._sorted = _SortedBlocks(load)
 
-                self._arr[swap_idx], self._arr[i] = self._arr[i], self._arr[
-                    swap_idx]
+    def __len__(self):
+        return len(self._values)
 
-                self._bubble_down(swap_idx)
+    def _check_timestamp(self, timestamp):
 
-    def _bubble_up(self, i):
-        parent = Heap._parent(i)
+        if self._duration is None:
+            return
 
-        if self._min_heap:
-            if parent >= 0 and self._arr[i] < self._arr[parent]:
+        if timestamp is None:
+            raise ValueError("A time window needs timestamps!")
 
-                self._arr[parent], self._arr[i] = self._arr[i], self._arr[
-                    parent]
+        if self._latest is not None and timestamp < self._latest:
+            raise ValueError("Timestamps must not decrease!")
 
-                self._bubble_up(parent)
-        else:
-            if parent >= 0 and self._arr[i] > self._arr[parent]:
-                self._arr[parent], self._arr[i] = self._arr[i], self._arr[
-                    parent]
+        self._latest = timestamp
 
-                self._bubble_up(parent)
+    def add(self, value, timestamp=None):
 
+        self._check_timestamp(timestamp)
 
-class OnlineMedian:
-    def __init__(self):
+        self._values.append(value)
+        self._sorted.add(value)
 
-        self._max_heap = Heap([], min_heap=False)
-        self._min_heap = Heap([], min_heap=True)
+        if self._timestamps is not None:
+            self._timestamps.append(timestamp)
 
-    def find_median(self, val):
-        """This algorithm implements the O(log(n)) method for finding median
-        of a sequence in an online fashion. The algorithm maintains two heap
-        for bookeeping. A max_heap to store the smaller half of the sequence
-        and a min_heap to store the greater half of the sequence. Median is
-        defined as a_ceiling(n/2). Note that the algorithm only needs to be
-        tweaked a little bit to work for the general definition of median.
-        """
+        self._evict()
 
-        if self._max_heap.size == 0 and self._min_heap.size == 0:
-            self._max_heap.insert(val)
-            return val
+    def advance(self, now):
+        """Move a time window forward to now without adding a sample"""
 
-        elif self._max_heap.size != 0 and self._min_heap.size == 0:
-            cur_median = self._max_heap.get_top()
+        self._check_timestamp(now)
+        self._evict()
 
-            if cur_median <= val:
-                self._min_heap.insert(val)
-                return cur_median
-            else:
-                self._min_heap.insert(cur_median)
-                self._max_heap.pop_top()
-                self._max_heap.insert(val)
-                return val
-        else:
-            max_heap_top = self._max_heap.get_top()
-            min_heap_top = self._min_heap.get_top()
+    def _evict(self, keep_sorted=True):
+        """Drop the samples that left the window, from the sorted blocks as
+        well unless they are about to be rebuilt"""
 
-            if val <= max_heap_top:
-                if self._max_heap.size == self._min_heap.size:
-                    self._max_heap.insert(val)
-                    return max_heap_top
-                else:
-                    self._min_heap.insert(max_heap_top)
-                    self._max_heap.pop_top()
-                    self._max_heap.insert(val)
-                    return self._max_heap.get_top()
-            elif max_heap_top < val < min_heap_top:
-                if self._max_heap.size == self._min_heap.size:
-                    self._max_heap.insert(val)
-                    return val
-                else:
-                    self._min_heap.insert(val)
-                    return max_heap_top
-            else:
-                if self._max_heap.size == self._min_heap.size:
-                    self._max_heap.insert(min_heap_top)
-                    self._min_heap.pop_top()
-                    self._min_heap.insert(val)
-                    return min_heap_top
-                else:
-                    self._min_heap.insert(val)
-                    return max_heap_top
+        values = self._values
+        remove = self._sorted.remove if keep_sorted else lambda value: None
+
+        if self._duration is None:
+            while len(values) > self._window:
+                remove(values.popleft())
+            return
+
+        timestamps = self._timestamps
+        oldest = self._latest - self._duration
 
+        while timestamps and timestamps[0] <= oldest:
+            timestamps.popleft()
+            remove(values.popleft())
 
-online_median = OnlineMedian()
+    def extend(self, values, timestamps=None):
+        """Add a batch of samples, timestamps being required by a time
+        window"""
 
-seq = [15, 10, 1, 20, 30]
+        values = np.asarray(values)
+
+        if timestamps is not None:
+            timestamps = np.asarray(timestamps)
+
+            if len(timestamps) != len(values):
+                raise ValueError(
+                    "values and timestamps must have the same length!")
+
+            if np.any(timestamps[1:] < timestamps[:-1]):
+                raise ValueError("Timestamps must not decrease!")
+
+        if len(values) == 0:
+            return
+
+        if len(values) * self._REBUILD_FACTOR < len(self) + len(values):
+            for value, timestamp in zip(
+                    values.tolist(), timestamps.tolist()
+                    if timestamps is not None else [None] * len(values)):
+                self.add(value, timestamp)
+            return
+
+        if self._duration is not None:
+            if timestamps is None:
+                raise ValueError("A time window needs timestamps!")
+
+            self._check_timestamp(timestamps[0].item())
+            self._check_timestamp(timestamps[-1].item())
+            self._timestamps.extend(timestamps.tolist())
+
+        self._values.extend(values.tolist())
+
+        # evict from the arrival order only, then sort the survivors
+        self._evict(keep_sorted=False)
+        self._sorted.rebuild(np.sort(np.array(self._values)).tolist())
+
+    def quantile(self, q):
+
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be in [0, 1]!")
+
+        if len(self) == 0:
+            raise IndexError("Can not query an empty window")
+
+        # rounding first keeps q * n = 3.0000000000000004 at rank 3
+        rank = math.ceil(round(q * len(self), 9))
+
+        return self._sorted.kth(max(rank, 1) - 1)
+
+    def quantiles(self, qs):
+        return [self.quantile(q) for q in qs]
+
+    def median(self):
+        return self.quantile(0.5)
+
+
+if __name__ == "__main__":
+
+    online_median = OnlineMedian()
+
+    seq = [15, 10, 1, 20, 30]
+
+    ret = [online_median.find_median(val) for val in seq]
+
+    print(ret)
+
+    rng = np.random.default_rng(0)
+    num_samples = 1 << 22
+    latencies = rng.lognormal(mean=3, sigma=1, size=num_samples)
+    timestamps = np.cumsum(rng.exponential(1e-6, size=num_samples))
+
+    print("%d samples, samples per second" % num_samples)
+
+    for name, make, batch in [
+        ("last 10k samples, batches of 64k",
+         lambda: SlidingWindowQuantile(window=10000), 1 << 16),
+        ("last 100k samples, batches of 64k",
+         lambda: SlidingWindowQuantile(window=100000), 1 << 16),
+        ("last 0.1 s, batches of 64k",
+         lambda: SlidingWindowQuantile(duration=0.1), 1 << 16),
+        ("last 100k samples, batches of 1k",
+         lambda: SlidingWindowQuantile(window=100000), 1 << 10),
+        ("last 10k samples, one by one",
+         lambda: SlidingWindowQuantile(window=10000), 1),
+    ]:
+        window = make()
+        size = num_samples if batch > 1 else num_samples // 16
+        timed = window._duration is not None
+
+        start = time.perf_counter()
+
+        if batch == 1:
+            for value in latencies[:size].tolist():
+                window.add(value)
+                window.median()
+        else:
+            for i in range(0, size, batch):
+                window.extend(latencies[i:i + batch],
+                              timestamps[i:i + batch] if timed else None)
+                window.quantiles([0.5, 0.9, 0.99])
 
-ret = [online_median.find_median(val) for val in seq]
+        elapsed = time.perf_counter() - start
 
-print(ret)
+        print("%40s %12.0f" % (name, size / elapsed))
@@ -0,0 +1,226 @@
+import numpy as np
+
+from pyfragments_xwkuang5.algo.monoid import fit_dtype, get_monoid
+
+
+class PersistentSegmentTree:
+    """A path-copying persistent segment tree
+
+    Every update copies the O(log(n)) nodes on the path from the root to the
+    updated leaf and returns a new version, all the other nodes are shared
+    with the version it was derived from. Any version can still be queried.
+
+    Nodes live in a pool of parallel numpy arrays (left child, right child,
+    value). Version 0 is laid out as an implicit heap over the pool, node i
+    having children 2i and 2i + 1, so it is built bottom-up with one ufunc
+    call per level. Children are stored as int32 until the pool outgrows it.
+    Values switch to a wider dtype when an update does not fit, as in
+    SegmentTree, so integer sums never wrap around.
+
+        construction: O(n) time, O(n) space
+        update: O(log(n)) time, O(log(n)) extra space per version
+        range query on any version: O(log(n))
+    """
+
+    def __init__(self, arr, tree_type='sum'):
+
+        self._monoid = get_monoid(tree_type)
+
+        leaves = self._monoid.elements(arr)
+
+        self._size = len(leaves)
+        self._log = max(self._size - 1, 0).bit_length()
+        self._capacity = 1 << self._log
+        self._max_abs = 0
+
+        if self._monoid.vectorized:
+            dtype, self._max_abs = fit_dtype(self._monoid, leaves.dtype,
+                                             leaves, 0, self._size)
+            leaves = leaves.astype(dtype, copy=False)
+
+        self._identity = self._monoid.identity(leaves.dtype)
+
+        pool_size = 2 * self._capacity
+        heap = np.arange(pool_size, dtype=np.int64)
+
+        self._left = np.where(heap < self._capacity, 2 * heap,
+                              0).astype(np.int32)
+        self._right = np.where(heap < self._capacity, 2 * heap + 1,
+                               0).astype(np.int32)
+        self._value = self._monoid.full((pool_size, ), leaves.dtype)
+        self._value[self._capacity:self._capacity + self._size] = leaves
+
+        self._num_nodes = pool_size
+        self._roots = [1]
+
+        self._construct()
+
+    def _construct(self):
+
+        value = self._value
+
+        for level in reversed(range(self._log)):
+            lo, hi = 1 << level, 2 << level
+            value[lo:hi] = self._monoid.ufunc(value[2 * lo:2 * hi:2],
+                                              value[2 * lo + 1:2 * hi:2])
+
+    @property
+    def num_versions(self):
+        return len(self._roots)
+
+    def _new_node(self):
+
+        if self._num_nodes == len(self._left):
+            self._grow()
+
+        node = self._num_nodes
+        self._num_nodes += 1
+
+        return node
+
+    def _grow(self):
+
+        capacity = 2 * len(self._left)
+        index_dtype = self._left.dtype
+
+        if capacity > np.iinfo(index_dtype).max:
+            index_dtype = np.int64
+
+        for name in ('_left', '_right', '_value'):
+            old = getattr(self, name)
+            dtype = old.dtype if name == '_value' else index_dtype
+            new = np.empty((capacity, ) + old.shape[1:], dtype=dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _widen(self, val):
+        """Switch the values of every version to a wider dtype if val does
+        not fit the current one"""
+
+        if not self._monoid.vectorized:
+            return
+
+        dtype, self._max_abs = fit_dtype(self._monoid, self._value.dtype, val,
+                                         self._max_abs, self._size)
+
+        if dtype == self._value.dtype:
+            return
+
+        empty = np.empty((0, ) + self._value.shape[1:], dtype=dtype)
+
+        try:
+            self._monoid.ufunc(empty, empty)
+        except TypeError:
+            raise ValueError("Values of type %s are not supported by the "
+                             "tree operator!" % dtype)
+
+        self._value = self._value.astype(dtype)
+        self._identity = self._monoid.identity(dtype)
+
+    def _root(self, version):
+
+        if version < 0 or version >= len(self._roots):
+            raise ValueError("Unknown version!")
+
+        return self._roots[version]
+
+    def update(self, version, idx, val):
+        """Derive a new version from `version` with position idx set to val
+
+        Return the number of the new version.
+        """
+
+        if idx < 0 or idx >= self._size:
+            raise ValueError("Incorrect update index!")
+
+        node = self._root(version)
+
+        if self._monoid.lift is not None:
+            val = self._monoid.lift([val], np.array([idx]))[0]
+
+        self._widen(val)
+
+        left, right, value = self._left, self._right, self._value
+        combine = self._monoid.combine
+
+        path = []
+        lo, hi = 0, self._capacity - 1
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+            went_left = idx <= mid
+            path.append((node, went_left))
+
+            if went_left:
+                node = left[node]
+                hi = mid
+            else:
+                node = right[node]
+                lo = mid + 1
+
+        child = self._new_node()
+        self._value[child] = val
+
+        for node, went_left in reversed(path):
+            copy = self._new_node()
+
+            # the pool may have been reallocated
+            left, right, value = self._left, self._right, self._value
+
+            if went_left:
+                left[copy] = child
+                right[copy] = right[node]
+            else:
+                left[copy] = left[node]
+                right[copy] = child
+
+            value[copy] = combine(value[left[copy]], value[right[copy]])
+            child = copy
+
+        self._roots.append(child)
+
+        return len(self._roots) - 1
+
+    def query(self, version, l, r):
+        """Aggregate of the closed range [l, r] in the given version"""
+
+        if l < 0 or r >= self._size:
+            raise ValueError("Incorrect query range!")
+
+        left, right, value = self._left, self._right, self._value
+        combine = self._monoid.combine
+
+        ret = self._identity
+
+        # visit left subtrees first to keep the operand order
+        stack = [(self._root(version), 0, self._capacity - 1)]
+
+        while stack:
+            node, lo, hi = stack.pop()
+
+            if r < lo or hi < l:
+                continue
+
+            if l <= lo and hi <= r:
+                ret = combine(ret, value[node])
+                continue
+
+            mid = (lo + hi) // 2
+            stack.append((right[node], mid + 1, hi))
+            stack.append((left[node], lo, mid))
+
+        return ret
+
+
+if __name__ == "__main__":
+
+    arr = [1, 2, 3, 4, 5, 6]
+
+    tree = PersistentSegmentTree(arr, 'sum')
+
+    v1 = tree.update(0, 5, -1)
+    v2 = tree.update(v1, 0, 10)
+
+    print(tree.query(0, 0, 5))
+    print(tree.query(v1, 0, 5))
+    print(tree.query(v2, 0, 5))
@@ -1,109 +1,282 @@
+# a handle is a slot number with the generation of the slot above it
+_SLOT_BITS = 32
+_SLOT_MASK = (1 << _SLOT_BITS) - 1
+
+
 class PriorityQueue:
-    """A min priority queue with decrease_key operations
+    """An indexed d-ary min priority queue
+
+    Every entry is an (item, priority) pair identified by an integer handle,
+    returned by insert, so priorities can be changed or entries removed
+    without searching for them, and equal items or priorities are no
+    problem. Priorities can be any mutually comparable values.
+
+    The heap is stored as two parallel lists indexed by heap position, the
+    slots of the entries and their priorities, so sifting only compares
+    priorities without any indirection. A third list maps every slot to its
+    heap position (-1 once the entry left the queue). Slots of popped or
+    removed entries are recycled by later inserts, but each slot counts its
+    entries and the handle carries that generation in its upper bits, so a
+    stale handle is rejected with KeyError instead of silently addressing
+    the new entry.
+
+    A node has `arity` children, so the heap has log_d(n) levels: sifting
+    up, as done by decrease_key, is cheaper than in a binary heap, and the
+    default of 4 children keeps the siblings compared when sifting down
+    next to each other.
+
+        construction from n entries: O(n)
+        insert, decrease_key: O(log_d(n))
+        pop, increase_key, remove: O(d * log_d(n))
     """
 
-    def __init__(self, arr):
+    def __init__(self, priorities=(), items=None, arity=4):
+        """Heapify the given priorities, entry i getting handle i"""
+
+        if arity < 2:
+            raise ValueError("Arity must be at least 2!")
+
+        self._arity = arity
+
+        self._prio = list(priorities)
+        self._heap = list(range(len(self._prio)))
+        self._pos = list(range(len(self._prio)))
 
-        self._map_key_to_idx = {}
+        if items is None:
+            self._items = [None] * len(self._prio)
+        else:
+            self._items = list(items)
 
-        self._size = len(arr)
-        self._arr = arr[:]
+            if len(self._items) != len(self._prio):
+                raise ValueError(
+                    "items and priorities must have the same length!")
+
+        self._gen = [0] * len(self._prio)
+        self._free = []
 
         self._build_heap()
 
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, handle):
+
+        slot = handle & _SLOT_MASK
+
+        return (handle >= 0 and slot < len(self._pos) and
+                self._pos[slot] != -1 and
+                self._gen[slot] == handle >> _SLOT_BITS)
+
     def is_empty(self):
-        return self._size == 0
+        return len(self._heap) == 0
+
+    def _check(self, handle):
+        """Heap position of the entry of handle"""
+
+        slot = handle & _SLOT_MASK
+
+        if (handle < 0 or slot >= len(self._pos) or
+                self._gen[slot] != handle >> _SLOT_BITS):
+            raise KeyError(handle)
+
+        i = self._pos[slot]
+
+        if i == -1:
+            raise KeyError(handle)
+
+        return i
+
+    def _handle(self, slot):
+        return slot | self._gen[slot] << _SLOT_BITS
 
-    def insert(self, key):
-        self._arr.append(key)
-        self._size += 1
+    def priority(self, handle):
+        return self._prio[self._check(handle)]
 
-        self._bubble_up(self._size - 1)
+    def item(self, handle):
+
+        self._check(handle)
+
+        return self._items[handle & _SLOT_MASK]
+
+    def insert(self, priority, item=None):
+        """Add an entry, return its handle"""
+
+        if self._free:
+            slot = self._free.pop()
+            self._items[slot] = item
+        else:
+            slot = len(self._pos)
+            self._pos.append(-1)
+            self._items.append(item)
+            self._gen.append(0)
+
+        self._heap.append(slot)
+        self._prio.append(priority)
+
+        self._sift_up(len(self._heap) - 1, slot, priority)
+
+        return self._handle(slot)
+
+    def peek(self):
+        """Return (item, priority) of the minimum entry"""
+
+        if self.is_empty():
+            raise IndexError("Can not peek into an empty queue")
+
+        return self._items[self._heap[0]], self._prio[0]
+
+    def peek_handle(self):
+
+        if self.is_empty():
+            raise IndexError("Can not peek into an empty queue")
+
+        return self._handle(self._heap[0])
 
     def pop(self):
-        assert not self.is_empty(), "Can not pop element from empty queue"
+        """Remove the minimum entry, return its (item, priority)"""
 
-        ret = self._arr[0]
+        if self.is_empty():
+            raise IndexError("Can not pop element from empty queue")
 
-        self._swap(0, self._size - 1)
-        self._size -= 1
-        self._arr.pop()
+        return self._remove_at(0)
 
-        self._bubble_down(0)
-        self._map_key_to_idx.pop(ret)
-        return ret
+    def remove(self, handle):
+        """Remove the entry of handle, return its (item, priority)"""
 
-    def decrease_key(self, key, decrement):
-        """Assumption: key is unique
+        return self._remove_at(self._check(handle))
 
-        This particular implementation is problematic because key is both the key and the value
-        """
-        assert decrement < 0, "Decrement can not be greater or equal to zero for a min priority queue"
+    def decrease_key(self, handle, priority):
 
-        idx = self._map_key_to_idx[key]
+        i = self._check(handle)
 
-        self._arr[idx] = key + decrement
+        if priority > self._prio[i]:
+            raise ValueError("New priority is greater than the current one!")
 
-        self._bubble_up(idx)
+        self._sift_up(i, self._heap[i], priority)
 
-    def _build_heap(self):
-        for i in reversed(range(self._start_of_child())):
-            self._bubble_down(i)
-
-    def _swap(self, i, j):
-
-        self._map_key_to_idx[self._arr[i]] = j
-        self._map_key_to_idx[self._arr[j]] = i
-
-        self._arr[i], self._arr[j] = self._arr[j], self._arr[i]
-
-    def _bubble_up(self, i):
-        while i > 0 and self._arr[i] < self._arr[self._parent(i)]:
-            self._swap(i, self._parent(i))
-            i = self._parent(i)
-
-    def _bubble_down(self, i):
-        while i < self._start_of_child():
-            left_child = self._left_child(i)
-            right_child = self._right_child(i)
-            min_idx = i
-            min_val = self._arr[i]
-
-            if min_val > self._arr[left_child]:
-                min_idx = left_child
-                min_val = self._arr[left_child]
-            if right_child < self._size and min_val > self._arr[right_child]:
-                min_idx = right_child
-                min_val = self._arr[right_child]
-
-            if min_idx != i:
-                self._swap(i, min_idx)
-                i = min_idx
+    def increase_key(self, handle, priority):
+
+        i = self._check(handle)
+
+        if priority < self._prio[i]:
+            raise ValueError("New priority is smaller than the current one!")
+
+        self._sift_down(i, self._heap[i], priority)
+
+    def update(self, handle, priority):
+        """Set the priority of handle, in either direction"""
+
+        i = self._check(handle)
+
+        if priority < self._prio[i]:
+            self._sift_up(i, self._heap[i], priority)
+        else:
+            self._sift_down(i, self._heap[i], priority)
+
+    def _remove_at(self, i):
+
+        heap, prio = self._heap, self._prio
+
+        slot = heap[i]
+        ret = self._items[slot], prio[i]
+
+        last_slot = heap.pop()
+        last_priority = prio.pop()
+
+        if i < len(heap):
+            # move the last entry into the hole, in whichever direction
+            if last_priority < prio[i]:
+                self._sift_up(i, last_slot, last_priority)
             else:
+                self._sift_down(i, last_slot, last_priority)
+
+        self._pos[slot] = -1
+        self._items[slot] = None
+        self._gen[slot] += 1
+        self._free.append(slot)
+
+        return ret
+
+    def _build_heap(self):
+
+        heap, prio = self._heap, self._prio
+
+        for i in reversed(range((len(heap) + self._arity - 2) //
+                                self._arity)):
+            self._sift_down(i, heap[i], prio[i])
+
+    def _sift_up(self, i, slot, priority):
+        """Place (slot, priority) at position i or above, moving the
+        larger ancestors down into the hole instead of swapping"""
+
+        heap, prio, pos = self._heap, self._prio, self._pos
+        arity = self._arity
+
+        while i > 0:
+            parent = (i - 1) // arity
+
+            if not priority < prio[parent]:
+                break
+
+            heap[i] = heap[parent]
+            prio[i] = prio[parent]
+            pos[heap[i]] = i
+            i = parent
+
+        heap[i] = slot
+        prio[i] = priority
+        pos[slot] = i
+
+    def _sift_down(self, i, slot, priority):
+        """Place (slot, priority) at position i or below, moving the
+        smallest child up into the hole instead of swapping"""
+
+        heap, prio, pos = self._heap, self._prio, self._pos
+        arity = self._arity
+        size = len(heap)
+
+        while True:
+            first = arity * i + 1
+
+            if first >= size:
                 break
 
-    def _left_child(self, i):
-        return 2 * i + 1
+            last = min(first + arity, size)
+
+            child = first
+            child_priority = prio[first]
+
+            for j in range(first + 1, last):
+                if prio[j] < child_priority:
+                    child = j
+                    child_priority = prio[j]
+
+            if not child_priority < priority:
+                break
 
-    def _right_child(self, i):
-        return 2 * (i + 1)
+            heap[i] = heap[child]
+            prio[i] = child_priority
+            pos[heap[i]] = i
+            i = child
 
-    def _parent(self, i):
-        return (i - 1) // 2
+        heap[i] = slot
+        prio[i] = priority
+        pos[slot] = i
 
-    def _start_of_child(self):
-        return self._size // 2
 
+if __name__ == "__main__":
 
-arr = [5, 4, 3, 2, 1]
+    pq = PriorityQueue([5, 4, 3, 2, 1], items="abcde")
 
-pq = PriorityQueue(arr)
+    pq.decrease_key(0, -1)
+    pq.increase_key(4, 10)
+    pq.remove(2)
 
-pq.decrease_key(5, -6)
+    pq.insert(2.5, "f")
 
-sorted_arr = []
+    sorted_arr = []
 
-while not pq.is_empty():
-    sorted_arr.append(pq.pop())
+    while not pq.is_empty():
+        sorted_arr.append(pq.pop())
 
-print(sorted_arr)
+    print(sorted_arr)
@@ -1,154 +1,256 @@
-import sys
-import math
+import numpy as np
+
+from pyfragments_xwkuang5.algo.monoid import MAX, MIN, SUM, Monoid
+from pyfragments_xwkuang5.algo.monoid import as_array, fit_dtype, get_monoid
+from pyfragments_xwkuang5.algo.monoid import object_array
 
 
 class SegmentTree:
-    """
+    """An iterative segment tree backed by a flat numpy array of size 2n
+
+    Leaves are stored at [n, 2n) and internal node i aggregates nodes 2i and
+    2i + 1, so the tree is built with one bottom-up sweep and both query and
+    update walk it with index arithmetic instead of recursion.
+
+    The operator is a Monoid (see algo/monoid.py), passed either directly or
+    by name ('sum', 'min', 'max', 'gcd', 'xor', 'argmin', 'count_sum'). It is
+    resolved once at construction, there is no per-node type dispatch.
+    Monoids with a numpy ufunc get vectorized builds and batch operations,
+    the others run the same code over object arrays. A product monoid such
+    as Monoid.product(SUM, MIN, MAX) keeps several aggregates in one tree.
+
+    Integer trees never wrap around: when a value, or for sums a possible
+    range aggregate (n times the largest magnitude seen), does not fit the
+    integer dtype, the tree switches to python ints in an object array.
+    Booleans are summed as integers, not or-ed.
+
     1. Properties of rangeSum with Segmentree:
         construction: O(n) time, O(n) space
         range query: O(log(n)) time (O(1) for prefix sum and O(n) for array)
         update: O(log(n)) (O(n) for prefix sum and O(1) for array)
-    
+
     2. Properties of rangeMinimum with Segmentree:
         construction: O(n) time, O(n) space
         range query: O(log(n)) time (O(n) for array)
         update: O(log(n)) (O(1) for array)
+
+    3. Batch operations (query_many / update_many):
+        k range queries: O(log(n)) vectorized sweeps over k ranges
+        k point updates: O(log(n)) vectorized sweeps over the touched nodes
     """
 
     def __init__(self, arr, tree_type='sum'):
 
-        height = math.ceil(math.log2(len(arr)))
-        self._tree_size = int(2 * math.pow(2, height) - 1)
-        self._size = len(arr)
-        self._tree_type = tree_type
-        self._arr = [None] * self._tree_size
-        self._construct(0, 0, self._size - 1, self._arr, arr, tree_type)
+        self._monoid = get_monoid(tree_type)
 
-    def _construct(self, root, l, r, tree_arr, arr, tree_type):
+        leaves = self._monoid.elements(arr)
 
-        if l == r:
-            tree_arr[root] = arr[l]
-        else:
+        self._size = len(leaves)
+        self._combine = self._monoid.combine
+        self._ufunc = self._monoid.ufunc
+        self._max_abs = 0
 
-            mid = (l + r) // 2
+        if self._monoid.vectorized:
+            leaves = leaves.astype(self._fit_dtype(leaves.dtype, leaves),
+                                   copy=False)
 
-            left = self._left(root)
-            right = self._right(root)
+        self._identity = self._monoid.identity(leaves.dtype)
 
-            self._construct(left, l, mid, tree_arr, arr, tree_type)
-            self._construct(right, mid + 1, r, tree_arr, arr, tree_type)
+        self._arr = np.empty((2 * self._size, ) + leaves.shape[1:],
+                             dtype=leaves.dtype)
+        self._arr[self._size:] = leaves
+        self._construct()
 
-            if tree_type == 'sum':
-                tree_arr[root] = tree_arr[left] + tree_arr[right]
-            elif tree_type == 'min':
-                tree_arr[root] = min(tree_arr[left], tree_arr[right])
+    def _construct(self):
+        """Build the internal nodes level by level from the leaves
 
-    def _update_range_min(self, idx, val):
-        l = 0
-        r = self._size - 1
-        root = 0
+        Nodes in [ceil(hi / 2), hi) only depend on nodes >= hi, so each block
+        is reduced with a single vectorized call.
+        """
 
-        while l < r:
-            self._arr[root] = min(self._arr[root], val)
+        tree = self._arr
+        hi = self._size
 
-            mid = (l + r) // 2
+        while hi > 1:
+            lo = (hi + 1) // 2
+            tree[lo:hi] = self._ufunc(tree[2 * lo:2 * hi:2],
+                                      tree[2 * lo + 1:2 * hi:2])
+            hi = lo
 
-            if idx <= mid:
-                r = mid
-                root = self._left(root)
-            else:
-                l = mid + 1
-                root = self._right(root)
+    def _fit_dtype(self, dtype, values):
 
-        self._arr[root] = min(self._arr[root], val)
+        dtype, self._max_abs = fit_dtype(self._monoid, dtype, values,
+                                         self._max_abs, self._size)
 
-    def _update_range_sum(self, idx, val):
-        l = 0
-        r = self._size - 1
+        return dtype
 
-        root = 0
+    def _widen(self, values):
+        """Switch the tree to a wider dtype if values do not fit the
+        current one, e.g. a float written into an integer tree or an int
+        that would overflow an integer sum"""
 
-        while l < r:
-            mid = (l + r) // 2
+        if not self._monoid.vectorized:
+            return
 
-            if idx <= mid:
-                r = mid
-                root = self._left(root)
-            else:
-                l = mid + 1
-                root = self._right(root)
+        dtype = self._fit_dtype(self._arr.dtype, values)
 
-        diff = val - self._arr[root]
+        if dtype == self._arr.dtype:
+            return
 
-        l = 0
-        r = self._size - 1
+        empty = np.empty((0, ) + self._arr.shape[1:], dtype=dtype)
 
-        root = 0
+        try:
+            self._ufunc(empty, empty)
+        except TypeError:
+            raise ValueError("Values of type %s are not supported by the "
+                             "tree operator!" % dtype)
 
-        while l < r:
-            self._arr[root] += diff
-
-            mid = (l + r) // 2
-            if idx <= mid:
-                r = mid
-                root = self._left(root)
-            else:
-                l = mid + 1
-                root = self._right(root)
-
-        self._arr[root] += diff
+        self._arr = self._arr.astype(dtype)
+        self._identity = self._monoid.identity(dtype)
 
     def update(self, idx, val):
 
         if idx < 0 or idx >= self._size:
             raise ValueError("Incorrect update index!")
 
-        if self._tree_type == 'sum':
-            self._update_range_sum(idx, val)
-        elif self._tree_type == 'min':
-            self._update_range_min(idx, val)
-        else:
-            raise ValueError("Invalid tree type!")
-
-    def _query_helper(self, root, l, r, low, high):
-
-        if l <= low <= high <= r:
-            return self._arr[root]
-        elif r < low or high < l:
-            if self._tree_type == 'sum':
-                return 0
-            elif self._tree_type == 'min':
-                return sys.maxsize
-            else:
-                raise ValueError("Invalid tree type!")
-        else:
-            mid = (low + high) // 2
-
-            left = self._query_helper(self._left(root), l, r, low, mid)
-            right = self._query_helper(self._right(root), l, r, mid + 1, high)
-
-            if self._tree_type == 'sum':
-                return left + right
-            elif self._tree_type == 'min':
-                return min(left, right)
-            else:
-                raise ValueError("Invalid tree type!")
+        if self._monoid.lift is not None:
+            val = self._monoid.lift([val], np.array([idx]))[0]
+
+        self._widen(val)
+
+        combine = self._combine
+        tree = self._arr
+
+        idx += self._size
+        tree[idx] = val
+        idx >>= 1
+
+        while idx >= 1:
+            tree[idx] = combine(tree[2 * idx], tree[2 * idx + 1])
+            idx >>= 1
+
+    def update_many(self, idxs, vals):
+        """Assign vals[i] to position idxs[i] for every i
+
+        If an index is repeated, the last value wins. Ancestors are recomputed
+        one tree level at a time so that every parent sees its final children.
+        """
+
+        idxs = np.asarray(idxs, dtype=np.intp)
+
+        if len(idxs) != len(vals):
+            raise ValueError("idxs and vals must have the same length!")
+        if idxs.size == 0:
+            return
+        if idxs.min() < 0 or idxs.max() >= self._size:
+            raise ValueError("Incorrect update index!")
+
+        if self._monoid.lift is not None:
+            vals = self._monoid.lift(vals, idxs)
+        if self._monoid.vectorized:
+            vals = as_array(vals)
+            self._widen(vals)
+            vals = vals.astype(self._arr.dtype, copy=False)
+        elif not isinstance(vals, np.ndarray):
+            vals = object_array(vals)
+
+        idxs, last = np.unique(idxs[::-1], return_index=True)
+        vals = vals[::-1][last]
+
+        tree = self._arr
+        nodes = idxs + self._size
+        tree[nodes] = vals
+        nodes = np.unique(nodes >> 1)
+        nodes = nodes[nodes > 0]
+
+        while nodes.size != 0:
+            level_start = 1 << (int(nodes[-1]).bit_length() - 1)
+            deepest = nodes[nodes >= level_start]
+            tree[deepest] = self._ufunc(tree[2 * deepest],
+                                        tree[2 * deepest + 1])
+            nodes = np.union1d(nodes[nodes < level_start], deepest >> 1)
+            nodes = nodes[nodes > 0]
 
     def query(self, l, r):
+        """Aggregate of the closed range [l, r]"""
+
+        if l < 0 or r >= self._size:
+            raise ValueError("Incorrect query range!")
+
+        combine = self._combine
+        tree = self._arr
+
+        left = right = self._identity
+        l += self._size
+        r += self._size + 1
+
+        while l < r:
+            if l & 1:
+                left = combine(left, tree[l])
+                l += 1
+            if r & 1:
+                r -= 1
+                right = combine(tree[r], right)
+            l >>= 1
+            r >>= 1
+
+        return combine(left, right)
+
+    def query_many(self, ls, rs):
+        """Aggregates of the closed ranges [ls[i], rs[i]] for every i
+
+        All ranges climb the tree together, one vectorized step per level.
+        """
+
+        l = np.array(ls, dtype=np.intp, copy=True)
+        r = np.array(rs, dtype=np.intp, copy=True)
+
+        if l.shape != r.shape:
+            raise ValueError("ls and rs must have the same shape!")
+        if l.size != 0 and (l.min() < 0 or r.max() >= self._size):
+            raise ValueError("Incorrect query range!")
+
+        ufunc = self._ufunc
+        tree = self._arr
+
+        left = self._monoid.full(l.shape, tree.dtype)
+        right = self._monoid.full(l.shape, tree.dtype)
+        l += self._size
+        r += self._size + 1
+
+        active = l < r
+
+        while active.any():
+            mask = active & (l & 1 == 1)
+            left[mask] = ufunc(left[mask], tree[l[mask]])
+            l[mask] += 1
+
+            mask = active & (r & 1 == 1)
+            r[mask] -= 1
+            right[mask] = ufunc(tree[r[mask]], right[mask])
+
+            l >>= 1
+            r >>= 1
+            active = l < r
+
+        return ufunc(left, right)
+
+
+if __name__ == "__main__":
 
-        return self._query_helper(0, l, r, 0, self._size - 1)
+    arr = [1, 2, 3, 4, 5, 6]
 
-    def _left(self, i):
-        return 2 * i + 1
+    tree = SegmentTree(arr, 'sum')
 
-    def _right(self, i):
-        return 2 * (i + 1)
+    print(tree.query(4, 5))
+    tree.update(5, -1)
+    print(tree.query(4, 5))
+    print(tree.query_many([0, 1, 4], [5, 3, 5]))
 
+    tree = SegmentTree(arr, Monoid.product(SUM, MIN, MAX))
 
-arr = [1, 2, 3, 4, 5, 6]
+    print(tree.query(1, 3))
 
-tree = SegmentTree(arr, 'sum')
+    tree = SegmentTree(arr, 'argmin')
 
-print(tree.query(4, 5))
-tree.update(5, -1)
-print(tree.query(4, 5))
+    print(tree.query(2, 5))
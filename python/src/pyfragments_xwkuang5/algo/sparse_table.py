@@ -0,0 +1,88 @@
+import numpy as np
+
+from pyfragments_xwkuang5.algo.monoid import get_monoid
+
+
+class SparseTable:
+    """A static range query index for idempotent operators (min, max, gcd)
+
+    Row k of the table holds the aggregate of every window of length 2^k,
+    each row being computed from the previous one with a single ufunc call.
+    A range [l, r] is then covered by two, possibly overlapping, windows of
+    length 2^floor(log2(r - l + 1)), which is only correct because
+    op(x, x) = x.
+
+    Use SegmentTree instead when the array changes.
+
+        construction: O(n * log(n)) time, O(n * log(n)) space
+        range query: O(1)
+        k range queries: O(k) vectorized
+    """
+
+    _IDEMPOTENT = ('min', 'max', 'gcd')
+
+    def __init__(self, arr, tree_type='min'):
+
+        if tree_type not in SparseTable._IDEMPOTENT:
+            raise ValueError("Invalid tree type!")
+
+        self._ufunc = get_monoid(tree_type).ufunc
+        self._combine = get_monoid(tree_type).combine
+
+        values = np.asarray(arr)
+
+        self._size = len(values)
+
+        levels = max(self._size.bit_length(), 1)
+
+        self._table = np.empty((levels, self._size), dtype=values.dtype)
+        self._table[0] = values
+
+        self._construct()
+
+    def _construct(self):
+
+        table = self._table
+
+        for k in range(1, len(table)):
+            half = 1 << (k - 1)
+            width = self._size - (1 << k) + 1
+            table[k, :width] = self._ufunc(table[k - 1, :width],
+                                           table[k - 1, half:half + width])
+
+    def query(self, l, r):
+        """Aggregate of the closed range [l, r]"""
+
+        if l < 0 or r >= self._size or l > r:
+            raise ValueError("Incorrect query range!")
+
+        k = (r - l + 1).bit_length() - 1
+        row = self._table[k]
+
+        return self._combine(row[l], row[r - (1 << k) + 1])
+
+    def query_many(self, ls, rs):
+        """Aggregates of the closed ranges [ls[i], rs[i]] for every i"""
+
+        ls = np.asarray(ls, dtype=np.intp)
+        rs = np.asarray(rs, dtype=np.intp)
+
+        if ls.size != 0 and (ls.min() < 0 or rs.max() >= self._size or
+                             np.any(ls > rs)):
+            raise ValueError("Incorrect query range!")
+
+        # frexp gives the exact exponent, unlike floor(log2(x))
+        k = np.frexp(rs - ls + 1)[1] - 1
+
+        return self._ufunc(self._table[k, ls],
+                           self._table[k, rs - (1 << k) + 1])
+
+
+if __name__ == "__main__":
+
+    arr = [5, 2, 4, 7, 1, 3, 6]
+
+    table = SparseTable(arr, 'min')
+
+    print(table.query(0, 3))
+    print(table.query_many([0, 2, 5], [6, 3, 6]))
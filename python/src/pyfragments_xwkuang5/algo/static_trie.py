@@ -0,0 +1,266 @@
+import mmap
+import struct
+from array import array
+
+_MAGIC = b'STRIE001'
+_HEADER = struct.Struct('<8sQQ')
+
+_SINGLE_BYTES = [bytes((b, )) for b in range(256)]
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def _popcount(x):
+    return bin(x).count('1')
+
+
+class StaticTrie:
+    """An immutable trie over a sorted key list, stored in one flat buffer
+
+    Nodes are numbered in level order (as in a LOUDS trie), so the children
+    of node i are the contiguous nodes [first_child[i], first_child[i + 1])
+    and their labels are sorted. The buffer holds, after a small header:
+
+        labels      : uint8 edge label of every node
+        first_child : uint32 per node, plus one end marker
+        terminal    : bit vector of the nodes that end a key, in uint64 words
+        rank        : uint32 count of terminal bits before every word
+        values      : int64 per key, in terminal (level) order
+
+    Keys are stored as utf-8 bytes, str and bytes keys are both accepted.
+    Values are integers and default to the rank of the key in the sorted
+    input. The buffer is written as is by save and mapped back by load, so
+    loading takes constant time regardless of the number of keys and the
+    pages are shared between every process mapping the same file. The
+    arrays are read through memoryview casts, which use the native byte
+    order, so files are only portable between machines of the same
+    endianness (little endian in practice).
+    """
+
+    def __init__(self, buffer):
+
+        self._raw = buffer
+        self._buffer = memoryview(buffer)
+
+        magic, self._num_nodes, self._num_keys = _HEADER.unpack_from(
+            self._buffer, 0)
+
+        if magic != _MAGIC:
+            raise ValueError("Not a StaticTrie buffer!")
+
+        num_nodes = self._num_nodes
+        num_words = (num_nodes + 63) // 64
+
+        offset = _HEADER.size
+
+        self._labels_start = offset
+        self._labels = self._buffer[offset:offset + num_nodes]
+        offset = _align(offset + num_nodes)
+
+        self._first_child = self._buffer[offset:offset + 4 *
+                                         (num_nodes + 1)].cast('I')
+        offset = _align(offset + 4 * (num_nodes + 1))
+
+        self._terminal = self._buffer[offset:offset + 8 * num_words].cast('Q')
+        offset += 8 * num_words
+
+        self._rank = self._buffer[offset:offset + 4 * num_words].cast('I')
+        offset = _align(offset + 4 * num_words)
+
+        self._values = self._buffer[offset:offset +
+                                    8 * self._num_keys].cast('q')
+
+    @classmethod
+    def build(cls, keys, values=None):
+        """Build from strictly increasing keys, values default to 0..n-1"""
+
+        keys = [key.encode('utf-8') if isinstance(key, str) else bytes(key)
+                for key in keys]
+
+        if values is None:
+            values = range(len(keys))
+        elif len(values) != len(keys):
+            raise ValueError("keys and values must have the same length!")
+
+        for prev, key in zip(keys, keys[1:]):
+            if prev >= key:
+                raise ValueError("Keys must be sorted and unique!")
+
+        labels = bytearray([0])
+        first_child = []
+        terminal = []
+        node_values = []
+
+        # every queued node is the key range [lo, hi) sharing `depth` bytes
+        queue = [(0, len(keys), 0)]
+        head = 0
+
+        while head < len(queue):
+            lo, hi, depth = queue[head]
+            head += 1
+
+            first_child.append(len(queue))
+
+            if lo < hi and len(keys[lo]) == depth:
+                terminal.append(True)
+                node_values.append(values[lo])
+                lo += 1
+            else:
+                terminal.append(False)
+
+            while lo < hi:
+                label = keys[lo][depth]
+                end = lo + 1
+                while end < hi and keys[end][depth] == label:
+                    end += 1
+
+                labels.append(label)
+                queue.append((lo, end, depth + 1))
+                lo = end
+
+        num_nodes = len(queue)
+        first_child.append(num_nodes)
+
+        num_words = (num_nodes + 63) // 64
+        words = [0] * num_words
+        for i, is_terminal in enumerate(terminal):
+            if is_terminal:
+                words[i >> 6] |= 1 << (i & 63)
+
+        rank = []
+        count = 0
+        for word in words:
+            rank.append(count)
+            count += _popcount(word)
+
+        buffer = bytearray(_HEADER.pack(_MAGIC, num_nodes, len(keys)))
+        sections = [
+            bytes(labels),
+            array('I', first_child).tobytes(),
+            array('Q', words).tobytes() + array('I', rank).tobytes(),
+            array('q', node_values).tobytes(),
+        ]
+
+        for section in sections:
+            buffer += section
+            buffer += bytes(_align(len(buffer)) - len(buffer))
+
+        return cls(bytes(buffer))
+
+    def save(self, path):
+
+        with open(path, 'wb') as f:
+            f.write(self._buffer)
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map a file written by save, without reading it"""
+
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        return cls(mapped)
+
+    def __len__(self):
+        return self._num_keys
+
+    def __contains__(self, key):
+
+        node = self._find(key)
+
+        return node is not None and bool(self._is_terminal(node))
+
+    def _child(self, node, label):
+
+        start = self._first_child[node]
+        end = self._first_child[node + 1]
+
+        if start == end:
+            return None
+
+        # sibling labels are distinct, a C-level find locates the child
+        pos = self._raw.find(_SINGLE_BYTES[label], self._labels_start + start,
+                             self._labels_start + end)
+
+        return None if pos == -1 else pos - self._labels_start
+
+    def _find(self, key):
+        """Return the node reached by key, None if it falls off the trie"""
+
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+
+        node = 0
+
+        for label in key:
+            node = self._child(node, label)
+
+            if node is None:
+                return None
+
+        return node
+
+    def _is_terminal(self, node):
+        return self._terminal[node >> 6] >> (node & 63) & 1
+
+    def _value(self, node):
+
+        word = self._terminal[node >> 6]
+        rank = self._rank[node >> 6] + _popcount(word & ((1 <<
+                                                           (node & 63)) - 1))
+
+        return self._values[rank]
+
+    def search(self, key):
+
+        node = self._find(key)
+
+        if node is None or not self._is_terminal(node):
+            return None
+
+        return self._value(node)
+
+    def iter_prefix(self, prefix):
+        """Lazily yield (key, val) for every key starting with prefix, in
+        sorted order. Keys are str if prefix is a str, bytes otherwise."""
+
+        as_str = isinstance(prefix, str)
+        start = self._find(prefix)
+
+        if start is None:
+            return
+
+        labels = self._labels
+        first_child = self._first_child
+
+        stack = [(start, prefix.encode('utf-8') if as_str else bytes(prefix))]
+
+        while stack:
+            node, key = stack.pop()
+
+            if self._is_terminal(node):
+                yield key.decode('utf-8') if as_str else key, self._value(node)
+
+            for child in range(first_child[node + 1] - 1,
+                               first_child[node] - 1, -1):
+                stack.append((child, key + _SINGLE_BYTES[labels[child]]))
+
+
+if __name__ == "__main__":
+
+    import os
+    import tempfile
+
+    words = sorted(["apple", "applet", "apply", "banana", "band", "bandana"])
+
+    trie = StaticTrie.build(words)
+
+    path = os.path.join(tempfile.mkdtemp(), "words.trie")
+    trie.save(path)
+
+    trie = StaticTrie.load(path)
+
+    print(trie.search("band"), trie.search("ban"))
+    print(list(trie.iter_prefix("app")))
@@ -2,6 +2,8 @@ class TrieNode:
     """A character trie node
     """
 
+    __slots__ = ('_val', '_children')
+
     def __init__(self, val):
 
         self._val = val
@@ -61,8 +63,234 @@ class Trie:
             stack.append((node, ch))
             node = node._children[ch]
 
-        node.val = None
+        node._val = None
 
-        while len(stack) > 0 and len(node._children) == 0:
+        # drop the nodes that no longer lead to any value
+        while len(stack) > 0 and len(node._children) == 0 and node._val is None:
             node, ch = stack.pop()
             node._children.pop(ch)
+
+
+_EMPTY = object()
+
+
+class RadixNode:
+    """A compressed (radix) trie node
+
+    The edge label leading to the node is src[start:end] where src is the
+    key that created the edge. Labels are never copied, and since src[:start]
+    is always the path from the root, src[:end] is the full key of the node.
+    """
+
+    __slots__ = ('_src', '_start', '_end', '_children', '_val')
+
+    def __init__(self, src, start, end, val=_EMPTY):
+
+        self._src = src
+        self._start = start
+        self._end = end
+        # allocated on the first child, most nodes are leaves
+        self._children = None
+        self._val = val
+
+    def _label(self):
+        return self._src[self._start:self._end]
+
+
+class RadixTrie:
+    """A path-compressed (Patricia) trie over str or bytes keys
+
+    Chains of single-child nodes are collapsed into one edge, so the number
+    of nodes is at most twice the number of keys. search returns None for
+    absent keys like Trie.search.
+    """
+
+    def __init__(self):
+
+        self._root = RadixNode(None, 0, 0)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def _child(self, node, first):
+
+        if node._children is None:
+            return None
+
+        return node._children.get(first)
+
+    def search(self, key):
+
+        node = self._root
+        i = 0
+        size = len(key)
+
+        while i < size:
+            node = self._child(node, key[i])
+
+            if node is None or not key.startswith(node._label(), i):
+                return None
+
+            i += node._end - node._start
+
+        return None if node._val is _EMPTY else node._val
+
+    def insert(self, key, val):
+
+        node = self._root
+        i = 0
+        size = len(key)
+
+        while i < size:
+            child = self._child(node, key[i])
+
+            if child is None:
+                if node._children is None:
+                    node._children = {}
+                node._children[key[i]] = RadixNode(key, i, size, val)
+                self._size += 1
+                return
+
+            label = child._label()
+
+            if not key.startswith(label, i):
+                # split the edge where key and label diverge
+                src, start = child._src, child._start
+                j = 1
+                while j < len(label) and i + j < size and key[i + j] == label[j]:
+                    j += 1
+
+                middle = RadixNode(src, start, start + j)
+                middle._children = {src[start + j]: child}
+                child._start = start + j
+                node._children[key[i]] = middle
+                child = middle
+
+            i += child._end - child._start
+            node = child
+
+        if node is self._root:
+            node._src = key
+
+        if node._val is _EMPTY:
+            self._size += 1
+
+        node._val = val
+
+    def remove(self, key):
+        """Remove key, return whether it was present
+
+        Nodes left without a value and with a single child are merged into
+        that child, so the trie stays compressed.
+        """
+
+        path = [self._root]
+        node = self._root
+        i = 0
+
+        while i < len(key):
+            node = self._child(node, key[i])
+
+            if node is None or not key.startswith(node._label(), i):
+                return False
+
+            i += node._end - node._start
+            path.append(node)
+
+        if node._val is _EMPTY:
+            return False
+
+        node._val = _EMPTY
+        self._size -= 1
+
+        if len(path) == 1:
+            return True
+
+        parent = path[-2]
+
+        if node._children is None or len(node._children) == 0:
+            parent._children.pop(node._src[node._start])
+            node, parent = parent, path[-3] if len(path) > 2 else None
+
+        # merge a valueless single-child node into its child
+        if (parent is not None and node._val is _EMPTY and
+                node._children is not None and len(node._children) == 1):
+            child = next(iter(node._children.values()))
+            child._start -= node._end - node._start
+            parent._children[child._src[child._start]] = child
+
+        return True
+
+    def _walk(self, node):
+        """Yield (key, val) under node in lexicographic order"""
+
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+
+            if node._val is not _EMPTY:
+                yield node._src[:node._end], node._val
+
+            if node._children:
+                stack.extend(node._children[first]
+                             for first in sorted(node._children, reverse=True))
+
+    def iter_prefix(self, prefix):
+        """Lazily yield (key, val) for every key starting with prefix"""
+
+        node = self._root
+        i = 0
+        size = len(prefix)
+
+        while i < size:
+            node = self._child(node, prefix[i])
+
+            if node is None:
+                return
+
+            length = node._end - node._start
+
+            if size - i <= length:
+                if not node._src.startswith(prefix[i:], node._start):
+                    return
+                break
+
+            if not prefix.startswith(node._label(), i):
+                return
+
+            i += length
+
+        yield from self._walk(node)
+
+    def prefixes_of(self, key):
+        """Lazily yield (prefix, val) for every stored prefix of key,
+        shortest first"""
+
+        node = self._root
+        i = 0
+
+        while True:
+            if node._val is not _EMPTY:
+                yield key[:i], node._val
+
+            if i == len(key):
+                return
+
+            node = self._child(node, key[i])
+
+            if node is None or not key.startswith(node._label(), i):
+                return
+
+            i += node._end - node._start
+
+    def longest_prefix_match(self, key):
+        """Return (prefix, val) of the longest stored prefix of key, or None"""
+
+        ret = None
+
+        for ret in self.prefixes_of(key):
+            pass
+
+        return ret